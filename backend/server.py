@@ -1,13 +1,15 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr, ConfigDict
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, ValidationError
+from pymongo import UpdateOne, ReplaceOne, DeleteMany, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta, date
@@ -15,9 +17,21 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from enum import Enum
 import mammoth
+import openpyxl
 import io
 import re
+import csv
+import unicodedata
+import json
+import base64
+import hashlib
 import asyncio
+import time
+from email.utils import format_datetime, parsedate_to_datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -31,6 +45,28 @@ db = client[os.environ['DB_NAME']]
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'premidis-secret-key-2025')
 JWT_ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 480
+ACCESS_TOKEN_TYPE = "access"
+
+# Calendar feed (ICS) URL tokens: own key and audience, never accepted as API bearer tokens
+ICS_FEED_SECRET_KEY = os.environ.get('ICS_FEED_SECRET_KEY', JWT_SECRET_KEY + ':ics-feed')
+ICS_FEED_AUDIENCE = "premidis-ics-feed"
+ICS_FEED_TOKEN_DAYS = int(os.environ.get('ICS_FEED_TOKEN_DAYS', '365'))
+
+# Principal cache settings (authenticated user documents kept in-process)
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', '2048'))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+
+# Stateless auth: trust profile claims signed into the JWT instead of reading db.users
+AUTH_STATELESS_CLAIMS = os.environ.get('AUTH_STATELESS_CLAIMS', 'false').lower() in ('1', 'true', 'yes')
+AUTH_REVOCATION_REFRESH_SECONDS = float(os.environ.get('AUTH_REVOCATION_REFRESH_SECONDS', '15'))
+
+# Admin login notifications are buffered and sent as one digest per window
+LOGIN_DIGEST_WINDOW_SECONDS = float(os.environ.get('LOGIN_DIGEST_WINDOW_SECONDS', '60'))
+LOGIN_DIGEST_MAX_BUFFER = int(os.environ.get('LOGIN_DIGEST_MAX_BUFFER', '500'))
+
+# Password hashing pool (bcrypt runs on dedicated threads, off the event loop)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '256'))
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -39,48 +75,6 @@ security = HTTPBearer()
 # Create the main app
 app = FastAPI(title="PREMIDIS SARL - HR Platform", version="2.0.0")
 
-# Will be defined later after database helpers
-_leave_reminder_task = None
-
-async def start_background_tasks():
-    """Start background tasks after app startup"""
-    global _leave_reminder_task
-    
-    async def daily_leave_reminder_loop():
-        """Background task that runs daily to send leave reminders"""
-        while True:
-            try:
-                # Wait until 8 AM tomorrow
-                now = datetime.now(timezone.utc)
-                tomorrow_8am = (now + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
-                wait_seconds = (tomorrow_8am - now).total_seconds()
-                
-                logging.info(f"Next leave reminder scheduled in {wait_seconds/3600:.1f} hours")
-                await asyncio.sleep(wait_seconds)
-                
-                # Send reminders - function will be defined later in the file
-                await send_leave_reminders_background()
-                logging.info("Daily leave reminders sent successfully")
-            except Exception as e:
-                logging.error(f"Error in daily leave reminder task: {e}")
-                await asyncio.sleep(3600)  # Wait 1 hour before retry
-    
-    _leave_reminder_task = asyncio.create_task(daily_leave_reminder_loop())
-    logging.info("Leave reminder scheduler started")
-
-@app.on_event("startup")
-async def startup_event():
-    """Startup event handler"""
-    await start_background_tasks()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Shutdown event handler"""
-    global _leave_reminder_task
-    if _leave_reminder_task:
-        _leave_reminder_task.cancel()
-        logging.info("Leave reminder scheduler stopped")
-
 # ==================== ENUMS ====================
 class UserRole(str, Enum):
     ADMIN = "admin"
@@ -186,6 +180,13 @@ class LeaveUpdate(BaseModel):
     status: Optional[str] = None  # approved, rejected, pending
     admin_comment: Optional[str] = None
 
+class LeaveBulkDecision(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+    
+    leave_ids: List[str]
+    status: LeaveStatus
+    admin_comment: Optional[str] = None
+
 class EmployeeUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
@@ -360,12 +361,306 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Async facade over bcrypt backed by a bounded thread pool.
+    
+    At most `workers` hashes run at once; further calls wait in the executor
+    queue, and once `max_queue` calls are waiting new ones are refused with a
+    503 instead of piling up behind a login burst.
+    """
+    
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._active = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self._busy_seconds = 0.0
+    
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return max(0, self._in_flight - self.workers)
+    
+    def _call(self, fn, *args):
+        with self._lock:
+            self._active += 1
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._busy_seconds += time.monotonic() - started
+    
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.max_queue > 0 and self._in_flight - self.workers >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Service temporairement surchargé, veuillez réessayer")
+            self._in_flight += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self._in_flight - self.workers)
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.completed += 1
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash a batch in parallel while leaving queue room for interactive logins"""
+        semaphore = asyncio.Semaphore(self.workers)
+        
+        async def _bounded(password: str) -> str:
+            async with semaphore:
+                return await self.hash(password)
+        
+        return await asyncio.gather(*[_bounded(p) for p in passwords])
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "active": self._active,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "peak_queue_depth": self.peak_queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_duration_ms": round(self._busy_seconds / self.completed * 1000, 1) if self.completed else 0.0
+            }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+# Fields handlers read from current_user; signed into the token in stateless mode
+PRINCIPAL_CLAIM_FIELDS = ["email", "role", "department", "position", "first_name", "last_name", "avatar_url", "site_id"]
+
+def principal_claims(user: dict) -> dict:
+    """Profile claims to embed in the access token (empty unless stateless mode is on)"""
+    if not AUTH_STATELESS_CLAIMS:
+        return {}
+    return {"usr": {field: user.get(field) for field in PRINCIPAL_CLAIM_FIELDS}}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": now, "typ": ACCESS_TOKEN_TYPE})
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
+class RevocationList:
+    """Compact set of users whose previously issued claims must not be trusted.
+    
+    Entries live in db.auth_revocations (expired by a TTL index once every
+    token they could affect has expired) and are mirrored in memory, refreshed
+    every AUTH_REVOCATION_REFRESH_SECONDS so other workers pick them up.
+    """
+    
+    # Reasons that end the session; anything else only forces a database read
+    BLOCKING_REASONS = {"deactivated", "deleted"}
+    
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._entries: Dict[str, tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh: Optional[datetime] = None
+    
+    def check(self, user_id: str, issued_at: Optional[int]) -> Optional[str]:
+        """Return the revocation reason if a token issued at `issued_at` is affected"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        revoked_at, reason = entry
+        if issued_at is None or issued_at <= revoked_at:
+            return reason
+        return None
+    
+    async def revoke(self, user_id: str, reason: str):
+        if not AUTH_STATELESS_CLAIMS or not user_id:
+            return
+        now = datetime.now(timezone.utc)
+        self._entries[user_id] = (int(now.timestamp()), reason)
+        await db.auth_revocations.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "user_id": user_id,
+                "reason": reason,
+                "revoked_at": now,
+                "expires_at": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            }},
+            upsert=True
+        )
+    
+    async def refresh(self):
+        entries = {}
+        async for doc in db.auth_revocations.find({}, {"_id": 0, "user_id": 1, "revoked_at": 1, "reason": 1}):
+            revoked_at = doc["revoked_at"]
+            if revoked_at.tzinfo is None:
+                revoked_at = revoked_at.replace(tzinfo=timezone.utc)
+            entries[doc["user_id"]] = (int(revoked_at.timestamp()), doc.get("reason", "claims_changed"))
+        self._entries = entries
+        self.last_refresh = datetime.now(timezone.utc)
+    
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing auth revocation list: {e}")
+    
+    async def start(self):
+        if not AUTH_STATELESS_CLAIMS:
+            return
+        await db.auth_revocations.create_index("user_id", unique=True)
+        await db.auth_revocations.create_index("expires_at", expireAfterSeconds=0)
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+    
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": AUTH_STATELESS_CLAIMS,
+            "entries": len(self._entries),
+            "refresh_seconds": self.refresh_seconds,
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None
+        }
+
+revocation_list = RevocationList(AUTH_REVOCATION_REFRESH_SECONDS)
+
+class PrincipalCache:
+    """Bounded TTL/LRU cache of user principals keyed by user id.
+    
+    Every write path that mutates a user must call invalidate_user() so the
+    next request reloads the document. The TTL bounds staleness when several
+    worker processes each hold their own cache.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+    
+    @property
+    def generation(self) -> int:
+        return self._generation
+    
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(entry[1])
+    
+    def set(self, user_id: str, user: dict, generation: int):
+        # A write that happened while the document was being loaded wins
+        if generation != self._generation or self.max_size <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, *user_ids: str):
+        self._generation += 1
+        for user_id in user_ids:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+    
+    def clear(self):
+        self._generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions
+        }
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+def invalidate_user(*user_ids: str):
+    """Drop cached principals after a user document was modified"""
+    principal_cache.invalidate(*[uid for uid in user_ids if uid])
+
+class TTLCache:
+    """Small in-process cache of computed values (aggregations) with a short TTL"""
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl_seconds:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self.invalidations += 1
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     try:
@@ -373,13 +668,31 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Token invalide")
+        # Only access tokens (tokens issued before "typ" existed have none) open the API
+        if payload.get("typ", ACCESS_TOKEN_TYPE) != ACCESS_TOKEN_TYPE or "aud" in payload or payload.get("scope") == "ics":
+            raise HTTPException(status_code=401, detail="Token invalide")
     except JWTError:
         raise HTTPException(status_code=401, detail="Token invalide")
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    # Stateless mode: signed claims are enough unless the user was revoked since
+    claims = payload.get("usr")
+    if AUTH_STATELESS_CLAIMS and claims:
+        reason = revocation_list.check(user_id, payload.get("iat"))
+        if reason is None:
+            return {**claims, "id": user_id}
+        if reason in RevocationList.BLOCKING_REASONS:
+            raise HTTPException(status_code=401, detail="Compte désactivé")
+    
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    generation = principal_cache.generation
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
     if user is None:
         raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
-    return user
+    principal_cache.set(user_id, user, generation)
+    return dict(user)
 
 def require_roles(allowed_roles: List[str]):
     async def role_checker(current_user: dict = Depends(get_current_user)):
@@ -388,20 +701,126 @@ def require_roles(allowed_roles: List[str]):
         return current_user
     return role_checker
 
-def calculate_working_days(start_date: str, end_date: str) -> int:
-    """Calculate working days between two dates (excluding weekends)"""
+def count_weekdays(start: date, end: date) -> int:
+    """Monday-Friday days in [start, end], computed arithmetically"""
+    if end < start:
+        return 0
+    full_weeks, extra_days = divmod((end - start).days + 1, 7)
+    first_weekday = start.weekday()
+    # Monday = 0, Friday = 4; at most 6 leftover days to classify
+    return full_weeks * 5 + sum(1 for i in range(extra_days) if (first_weekday + i) % 7 < 5)
+
+def calculate_working_days(start_date: str, end_date: str, holidays: Optional[List[date]] = None) -> int:
+    """Calculate working days between two dates (excluding weekends and the given public holidays)"""
     start = datetime.strptime(start_date, "%Y-%m-%d").date()
     end = datetime.strptime(end_date, "%Y-%m-%d").date()
     
-    working_days = 0
-    current = start
-    while current <= end:
-        if current.weekday() < 5:  # Monday = 0, Friday = 4
-            working_days += 1
-        current += timedelta(days=1)
-    
+    working_days = count_weekdays(start, end)
+    if holidays:
+        working_days -= sum(1 for day in set(holidays) if start <= day <= end and day.weekday() < 5)
     return working_days
 
+def busday_counts(start_dates: List[str], end_dates: List[str], holidays: List[date]) -> List[int]:
+    """Vectorized calculate_working_days for a batch of (start, end) pairs"""
+    starts = np.array(start_dates, dtype="datetime64[D]")
+    # busday_count excludes the end date, leaves include it
+    ends = np.array(end_dates, dtype="datetime64[D]") + np.timedelta64(1, "D")
+    counts = np.busday_count(starts, ends, holidays=np.array(sorted(holidays), dtype="datetime64[D]"))
+    return np.maximum(counts, 0).tolist()
+
+def native_date_range(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """start_at/end_at as UTC-midnight datetimes (BSON dates) next to the YYYY-MM-DD strings"""
+    try:
+        start_at = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        end_at = datetime.strptime(end_date or start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return {}
+    return {"start_at": start_at, "end_at": end_at}
+
+def month_range(year: int, month: int) -> tuple:
+    """First and last day of a month as UTC-midnight datetimes"""
+    first = datetime(year, month, 1, tzinfo=timezone.utc)
+    next_first = datetime(year + 1, 1, 1, tzinfo=timezone.utc) if month == 12 else datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return first, next_first - timedelta(days=1)
+
+def date_overlap_query(range_start: datetime, range_end: datetime) -> dict:
+    """Documents whose [start_at, end_at] intersects [range_start, range_end]"""
+    return {"start_at": {"$lte": range_end}, "end_at": {"$gte": range_start}}
+
+HOLIDAY_CACHE_TTL_SECONDS = int(os.environ.get('HOLIDAY_CACHE_TTL_SECONDS', '600'))
+
+class HolidayCalendar:
+    """Public holidays (db.calendar, type public_holiday) cached in memory per year.
+    
+    Invalidated locally by add_public_holiday; the TTL bounds staleness on other workers.
+    """
+    def __init__(self, ttl_seconds: int = HOLIDAY_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._years: Dict[int, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    async def _load_year(self, year: int) -> frozenset:
+        first = datetime(year, 1, 1, tzinfo=timezone.utc)
+        last = datetime(year, 12, 31, tzinfo=timezone.utc)
+        days = set()
+        cursor = db.calendar.find(
+            {"type": "public_holiday", **date_overlap_query(first, last)},
+            {"_id": 0, "start_date": 1, "end_date": 1}
+        )
+        async for holiday in cursor:
+            try:
+                day = datetime.strptime(holiday["start_date"], "%Y-%m-%d").date()
+                end = datetime.strptime(holiday.get("end_date") or holiday["start_date"], "%Y-%m-%d").date()
+            except (KeyError, TypeError, ValueError):
+                continue
+            while day <= end:
+                if day.year == year:
+                    days.add(day)
+                day += timedelta(days=1)
+        return frozenset(days)
+    
+    async def year(self, year: int) -> frozenset:
+        entry = self._years.get(year)
+        if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        days = await self._load_year(year)
+        self._years[year] = (time.monotonic(), days)
+        return days
+    
+    async def between(self, start: date, end: date) -> List[date]:
+        days = []
+        for year in range(start.year, end.year + 1):
+            days.extend(day for day in await self.year(year) if start <= day <= end)
+        return sorted(days)
+    
+    def invalidate(self, *years: int):
+        self.invalidations += 1
+        if not years:
+            self._years.clear()
+        for year in years:
+            self._years.pop(year, None)
+    
+    def stats(self) -> dict:
+        return {
+            "cached_years": sorted(self._years),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
+
+holiday_calendar = HolidayCalendar()
+
+async def working_days_between(start_date: str, end_date: str) -> int:
+    """calculate_working_days with the cached public holidays of the period"""
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    holidays = await holiday_calendar.between(start, end) if end >= start else []
+    return calculate_working_days(start_date, end_date, holidays)
+
 def calculate_age(birth_date: str) -> int:
     """Calculate age from birth date"""
     if not birth_date:
@@ -424,6 +843,564 @@ upload_router = APIRouter(prefix="/upload", tags=["Upload"])
 notifications_router = APIRouter(prefix="/notifications", tags=["Notifications"])
 sites_router = APIRouter(prefix="/sites", tags=["Sites de travail"])
 permissions_router = APIRouter(prefix="/permissions", tags=["Permissions Dynamiques"])
+metrics_router = APIRouter(prefix="/metrics", tags=["Métriques"])
+jobs_router = APIRouter(prefix="/jobs", tags=["Tâches de fond"])
+scheduler_router = APIRouter(prefix="/scheduler", tags=["Planificateur"])
+
+# ==================== FIELD PROJECTIONS ====================
+class FieldSet:
+    """Per-endpoint whitelist turning a `fields=` query parameter into a Mongo projection.
+    
+    - no value / "summary": every field except the heavy ones (table views)
+    - "full": every field
+    - "a,b,c": only the listed fields (must be whitelisted), "id" is always included
+    """
+    def __init__(self, allowed: List[str], heavy: Optional[List[str]] = None, hidden: Optional[List[str]] = None):
+        self.allowed = set(allowed)
+        self.heavy = list(heavy or [])
+        self.hidden = list(hidden or [])
+    
+    def projection(self, fields: Optional[str]) -> dict:
+        if not fields or fields == "summary":
+            return {"_id": 0, **{f: 0 for f in self.hidden + self.heavy}}
+        if fields == "full":
+            return {"_id": 0, **{f: 0 for f in self.hidden}}
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = sorted(requested - self.allowed)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Champ(s) non autorisé(s): {', '.join(unknown)}")
+        return {"_id": 0, "id": 1, **{f: 1 for f in requested}}
+
+EMPLOYEE_FIELDS = FieldSet(
+    allowed=list(UserResponse.model_fields) + ["status", "created_by"],
+    hidden=["password", "search_tokens", "search_rank", "ics_feed_version"]
+)
+LEAVE_FIELDS = FieldSet(allowed=[
+    "employee_id", "employee_name", "department", "position", "site_id", "leave_type", "start_date", "end_date",
+    "working_days", "reason", "status", "is_collective", "created_at", "created_by", "admin_comment",
+    "approved_by", "approved_at"
+], hidden=["start_at", "end_at", "ledger_seq", "decision_batch"])
+BEHAVIOR_FIELDS = FieldSet(allowed=[
+    "employee_id", "employee_name", "type", "note", "date", "file_name", "file_url", "document_urls",
+    "created_by", "created_by_name", "created_at"
+])
+HR_DOCUMENT_FIELDS = FieldSet(allowed=[
+    "template_id", "template_name", "employee_id", "employee_name", "beneficiary_name",
+    "beneficiary_matricule", "document_type", "period_start", "period_end", "reason", "source_module",
+    "source_id", "content", "original_template", "status", "created_at", "created_by", "created_by_name",
+    "approved_by", "approved_by_name", "approved_at", "approval_action", "approval_comment",
+    "signature_image_url", "stamp_image_url", "updated_at"
+], heavy=["content", "original_template"])
+DOCUMENT_FIELDS = FieldSet(allowed=[
+    "form_id", "title", "content", "author_id", "author_name", "created_at", "updated_at"
+], heavy=["content"])
+FORM_FIELDS = FieldSet(allowed=[
+    "name", "description", "category", "thumbnail_url", "content", "is_system", "file_url",
+    "created_at", "created_by"
+], heavy=["content"])
+
+# ==================== TASK RUNNER ====================
+TASK_RUNNER_WORKERS = int(os.environ.get('TASK_RUNNER_WORKERS', '4'))
+TASK_RUNNER_MAX_QUEUE = int(os.environ.get('TASK_RUNNER_MAX_QUEUE', '1000'))
+TASK_RUNNER_OVERFLOW = os.environ.get('TASK_RUNNER_OVERFLOW', 'drop_new')  # drop_new | drop_oldest
+TASK_RUNNER_DRAIN_SECONDS = float(os.environ.get('TASK_RUNNER_DRAIN_SECONDS', '10'))
+
+class TaskRunner:
+    """Fire-and-forget work (notifications, cache refreshes) run by a fixed pool of workers.
+    
+    submit() never blocks the request: when the bounded queue is full the overflow policy either
+    drops the new item or evicts the oldest queued one. put() waits for room instead (backpressure).
+    Failures are logged and counted per task name; stop() drains the queue before cancelling workers.
+    """
+    def __init__(self, workers: int = TASK_RUNNER_WORKERS, max_queue: int = TASK_RUNNER_MAX_QUEUE,
+                 overflow: str = TASK_RUNNER_OVERFLOW):
+        self.workers = workers
+        self.overflow = overflow
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.failures_by_name: Dict[str, int] = {}
+    
+    def start(self):
+        # Queue created in the running loop (the app may be started more than once per process, e.g. in tests)
+        self._queue = asyncio.Queue(maxsize=self._queue.maxsize)
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    def submit(self, func, *args, name: Optional[str] = None) -> bool:
+        """Queue `await func(*args)`; False when the work was dropped"""
+        if not self._accepting:
+            self.dropped += 1
+            return False
+        item = (name or func.__name__, func, args)
+        if self._queue.full():
+            if self.overflow != "drop_oldest":
+                self.dropped += 1
+                logger.warning(f"Task queue full, dropped {item[0]}")
+                return False
+            evicted = self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+            logger.warning(f"Task queue full, dropped {evicted[0]}")
+        self._queue.put_nowait(item)
+        self.submitted += 1
+        return True
+    
+    async def put(self, func, *args, name: Optional[str] = None) -> bool:
+        """Queue `await func(*args)`, waiting for room when the queue is full"""
+        if not self._accepting:
+            self.dropped += 1
+            return False
+        await self._queue.put((name or func.__name__, func, args))
+        self.submitted += 1
+        return True
+    
+    async def _worker(self):
+        while True:
+            name, func, args = await self._queue.get()
+            self.active += 1
+            try:
+                await func(*args)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                self.failures_by_name[name] = self.failures_by_name.get(name, 0) + 1
+                logger.exception(f"Background task {name} failed")
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+    
+    async def join(self):
+        """Wait until every queued task has run"""
+        await self._queue.join()
+    
+    async def stop(self, timeout: float = TASK_RUNNER_DRAIN_SECONDS):
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Task runner stopped with {self._queue.qsize()} task(s) still queued")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "overflow": self.overflow,
+            "active": self.active,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "failures_by_name": self.failures_by_name
+        }
+
+task_runner = TaskRunner()
+
+# ==================== BACKGROUND JOBS ====================
+BACKGROUND_JOB_HEARTBEAT_SECONDS = float(os.environ.get('BACKGROUND_JOB_HEARTBEAT_SECONDS', '15'))
+BACKGROUND_JOB_STALE_SECONDS = float(os.environ.get('BACKGROUND_JOB_STALE_SECONDS', '90'))
+
+class BackgroundJobs:
+    """Jobs persisted in db.background_jobs and executed as tasks of this worker.
+    
+    A worker runs a job only after claiming it atomically (worker_id + heartbeat_at) and keeps the
+    heartbeat fresh while it runs; resume() picks up queued jobs and running jobs whose heartbeat is
+    stale. Handlers receive the job document and must be idempotent: resumed jobs restart from scratch.
+    """
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.handlers = {}
+        self._tasks = set()
+        self._owned: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+    
+    def handler(self, job_type: str):
+        def register(func):
+            self.handlers[job_type] = func
+            return func
+        return register
+    
+    async def enqueue(self, job_type: str, params: dict, created_by: Optional[str]) -> dict:
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "status": "queued",
+            "params": params,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "created_by": created_by,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "worker_id": None,
+            "heartbeat_at": None
+        }
+        await db.background_jobs.insert_one(job)
+        job.pop("_id", None)
+        self._spawn(job)
+        return job
+    
+    def _spawn(self, job: dict):
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _claim(self, job_id: str) -> Optional[dict]:
+        """Take ownership of a queued job, or of a running one whose worker stopped heartbeating"""
+        now = datetime.now(timezone.utc)
+        return await db.background_jobs.find_one_and_update(
+            {"id": job_id, "$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=BACKGROUND_JOB_STALE_SECONDS)}},
+                {"status": "running", "heartbeat_at": None}
+            ]},
+            {"$set": {"status": "running", "worker_id": self.worker_id, "heartbeat_at": now, "started_at": now.isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(BACKGROUND_JOB_HEARTBEAT_SECONDS)
+            await db.background_jobs.update_one(
+                {"id": job_id, "worker_id": self.worker_id, "status": "running"},
+                {"$set": {"heartbeat_at": datetime.now(timezone.utc)}}
+            )
+    
+    async def _finish(self, job_id: str, fields: dict):
+        # Only the owner records the outcome (a stale owner may have been superseded)
+        await db.background_jobs.update_one(
+            {"id": job_id, "worker_id": self.worker_id},
+            {"$set": {**fields, "finished_at": datetime.now(timezone.utc).isoformat()}}
+        )
+    
+    async def _run(self, job: dict):
+        if job["id"] in self._owned:
+            return
+        claimed = await self._claim(job["id"])
+        if not claimed:
+            return  # another worker owns it
+        self._owned[job["id"]] = asyncio.current_task()
+        self.started += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            result = await self.handlers[claimed["type"]](claimed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.exception(f"Background job {job['type']} {job['id']} failed")
+            await self._finish(job["id"], {"status": "failed", "error": str(e)})
+            return
+        finally:
+            heartbeat.cancel()
+            self._owned.pop(job["id"], None)
+        self.completed += 1
+        await self._finish(job["id"], {"status": "completed", "result": result})
+    
+    async def progress(self, job_id: str, **progress):
+        await db.background_jobs.update_one(
+            {"id": job_id},
+            {"$set": {f"progress.{key}": value for key, value in progress.items()}}
+        )
+    
+    async def resume(self) -> int:
+        """Restart queued jobs and jobs whose worker died (stale heartbeat); the claim keeps each single-run"""
+        stale = datetime.now(timezone.utc) - timedelta(seconds=BACKGROUND_JOB_STALE_SECONDS)
+        resumed = 0
+        async for job in db.background_jobs.find({"$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeat_at": {"$lt": stale}},
+            {"status": "running", "heartbeat_at": None}
+        ]}, {"_id": 0}):
+            if job["type"] in self.handlers and job["id"] not in self._owned:
+                self._spawn(job)
+                resumed += 1
+        return resumed
+    
+    async def stop(self):
+        owned = list(self._owned)
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if owned:
+            # Hand interrupted jobs back right away instead of waiting for the heartbeat to go stale
+            await db.background_jobs.update_many(
+                {"id": {"$in": owned}, "worker_id": self.worker_id, "status": "running"},
+                {"$set": {"status": "queued", "worker_id": None, "heartbeat_at": None}}
+            )
+    
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tasks),
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+background_jobs = BackgroundJobs()
+
+@jobs_router.get("/{job_id}")
+async def get_background_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status and progress of a background job"""
+    job = await db.background_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Tâche non trouvée")
+    if current_user["role"] not in ["admin", "super_admin"] and job.get("created_by") != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    return job
+
+# ==================== SCHEDULER ====================
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week), evaluated in UTC.
+    
+    Supports *, lists, ranges and steps (e.g. "0 8 * * 1-5", "*/15 * * * *"); day-of-week 0 or 7 is Sunday.
+    """
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression: {expression!r}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+    
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = (int(v) for v in base.split("-", 1))
+            else:
+                start = end = int(base)
+                if step:
+                    end = high
+            if not (low <= start <= end <= high):
+                raise ValueError(f"Cron field out of range: {field!r}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+    
+    def _day_matches(self, t: datetime) -> bool:
+        day_ok = t.day in self.days
+        weekday_ok = (t.weekday() + 1) % 7 in self.weekdays
+        # Standard cron: when both day fields are restricted, either one matching is enough
+        if not self.any_day and not self.any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+    
+    def next_after(self, after: datetime) -> datetime:
+        """First matching minute strictly after `after`"""
+        t = after.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', '30'))
+SCHEDULER_LEASE_SECONDS = float(os.environ.get('SCHEDULER_LEASE_SECONDS', '90'))
+SCHEDULER_STALE_RUN_SECONDS = float(os.environ.get('SCHEDULER_STALE_RUN_SECONDS', '3600'))
+
+class Scheduler:
+    """Cron jobs shared by every worker through db.scheduled_jobs.
+    
+    Only the worker holding the leader lease (db.scheduler_lease, renewed each tick) runs jobs. A run is
+    claimed with a conditional update on next_run_at, so a job fires once even if two workers briefly
+    overlap. Runs missed while no worker was up are caught up once on the next tick; a run whose worker
+    died is retried once it is older than SCHEDULER_STALE_RUN_SECONDS.
+    """
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, tuple] = {}
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self.runs = 0
+        self.failures = 0
+    
+    def job(self, name: str, cron: str, catch_up: bool = True):
+        """Register an async function without arguments to run on a cron schedule"""
+        schedule = CronSchedule(cron)
+        def register(func):
+            self.jobs[name] = (schedule, func, catch_up)
+            return func
+        return register
+    
+    async def start(self):
+        await db.scheduled_jobs.create_index("name", unique=True)
+        await db.scheduler_lease.create_index("id", unique=True)
+        now = datetime.now(timezone.utc)
+        for name, (schedule, _, _) in self.jobs.items():
+            existing = await db.scheduled_jobs.find_one({"name": name}, {"_id": 0, "cron": 1})
+            if existing and existing.get("cron") == schedule.expression:
+                continue
+            # New job, or its cron expression changed: the next run is computed from now
+            try:
+                await db.scheduled_jobs.update_one(
+                    {"name": name},
+                    {"$set": {"cron": schedule.expression, "next_run_at": schedule.next_after(now)},
+                     "$setOnInsert": {"last_run_at": None, "last_status": None, "running_since": None}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass  # registered concurrently by another worker
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Scheduler started ({len(self.jobs)} job(s), worker {self.worker_id})")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for task in self._running.values():
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+        if self.is_leader:
+            # Hand over right away instead of letting the lease expire
+            await db.scheduler_lease.update_one(
+                {"id": "leader", "holder": self.worker_id},
+                {"$set": {"expires_at": datetime.now(timezone.utc)}}
+            )
+            self.is_leader = False
+    
+    async def _acquire_lease(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await db.scheduler_lease.find_one_and_update(
+                {"id": "leader", "$or": [{"holder": self.worker_id}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.worker_id, "expires_at": now + timedelta(seconds=SCHEDULER_LEASE_SECONDS)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds a live lease (the upsert collided with its document)
+            lease = None
+        self.is_leader = bool(lease and lease.get("holder") == self.worker_id)
+        return self.is_leader
+    
+    async def _loop(self):
+        while True:
+            try:
+                if await self._acquire_lease():
+                    await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+    
+    async def run_due(self):
+        """Claim and start every registered job whose next run is due"""
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=SCHEDULER_STALE_RUN_SECONDS)
+        for name, (schedule, func, catch_up) in self.jobs.items():
+            if name in self._running:
+                continue
+            claimed = await db.scheduled_jobs.find_one_and_update(
+                {
+                    "name": name,
+                    "next_run_at": {"$lte": now},
+                    "$or": [{"running_since": None}, {"running_since": {"$lt": stale}}]
+                },
+                {"$set": {"running_since": now, "running_by": self.worker_id}},
+                return_document=ReturnDocument.AFTER
+            )
+            if not claimed:
+                continue
+            scheduled_for = claimed["next_run_at"]
+            if scheduled_for.tzinfo is None:
+                scheduled_for = scheduled_for.replace(tzinfo=timezone.utc)
+            # Without catch-up, a run missed by more than one period is skipped
+            if not catch_up and schedule.next_after(scheduled_for) <= now:
+                await db.scheduled_jobs.update_one(
+                    {"name": name},
+                    {"$set": {"running_since": None, "last_status": "skipped", "next_run_at": schedule.next_after(now)}}
+                )
+                continue
+            task = asyncio.create_task(self._run(name, schedule, func, scheduled_for))
+            self._running[name] = task
+            task.add_done_callback(lambda _, name=name: self._running.pop(name, None))
+    
+    async def _run(self, name: str, schedule: CronSchedule, func, scheduled_for: datetime):
+        started = time.monotonic()
+        update = {"running_since": None, "last_run_at": datetime.now(timezone.utc), "last_scheduled_for": scheduled_for}
+        try:
+            result = await func()
+            update.update({"last_status": "completed", "last_result": result, "last_error": None})
+            self.runs += 1
+        except asyncio.CancelledError:
+            # Shutdown: leave running_since so the next leader retries after the stale delay
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.exception(f"Scheduled job {name} failed")
+            update.update({"last_status": "failed", "last_error": str(e)})
+        update["last_duration_ms"] = round((time.monotonic() - started) * 1000)
+        update["next_run_at"] = schedule.next_after(datetime.now(timezone.utc))
+        await db.scheduled_jobs.update_one({"name": name}, {"$set": update})
+    
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "is_leader": self.is_leader,
+            "jobs": len(self.jobs),
+            "running": len(self._running),
+            "runs": self.runs,
+            "failures": self.failures
+        }
+
+scheduler = Scheduler()
+
+@scheduler.job("resume_background_jobs", "*/5 * * * *", catch_up=False)
+async def resume_background_jobs() -> dict:
+    """Pick up jobs left behind by a worker that died without handing them back"""
+    return {"resumed": await background_jobs.resume()}
+
+@scheduler_router.get("")
+async def list_scheduled_jobs(current_user: dict = Depends(require_roles(["admin", "super_admin"]))):
+    """Scheduled jobs with their last and next run"""
+    jobs = await db.scheduled_jobs.find({}, {"_id": 0}).sort("name", 1).to_list(100)
+    return {"jobs": jobs, "scheduler": scheduler.stats()}
+
+@scheduler_router.post("/{name}/run")
+async def run_scheduled_job_now(name: str, current_user: dict = Depends(require_roles(["admin", "super_admin"]))):
+    """Make a scheduled job due now; the leader runs it at its next tick"""
+    result = await db.scheduled_jobs.update_one({"name": name}, {"$set": {"next_run_at": datetime.now(timezone.utc)}})
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Tâche planifiée non trouvée")
+    return {"message": "Exécution planifiée", "name": name}
 
 # ==================== AUTH ROUTES ====================
 
@@ -435,12 +1412,10 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email déjà enregistré")
     
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     
     # Get default leave rules
-    leave_rules = await db.leave_rules.find_one({"type": "default"}, {"_id": 0})
-    if not leave_rules:
-        leave_rules = LeaveRuleConfig().model_dump()
+    leave_rules = await config_cache.leave_rules()
     
     # ALL ACCOUNTS ARE ACTIVE IMMEDIATELY - NO APPROVAL REQUIRED
     user_doc = {
@@ -476,11 +1451,14 @@ async def register(user_data: UserCreate):
             "paternity": 0
         }
     }
+    user_doc.update(employee_search_keys(user_doc))
+    user_doc["ledger_opened_at"] = user_doc["created_at"]
     
     await db.users.insert_one(user_doc)
+    await open_leave_ledger([user_doc])
     
     # Return token immediately for ALL roles
-    access_token = create_access_token(data={"sub": user_id, "role": user_data.role})
+    access_token = create_access_token(data={"sub": user_id, "role": user_data.role, **principal_claims(user_doc)})
     
     user_response = UserResponse(
         id=user_id,
@@ -501,37 +1479,28 @@ async def register(user_data: UserCreate):
 async def login(credentials: UserLogin):
     """Login - simple check for active account"""
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await password_hasher.verify(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Identifiants invalides")
     
     if not user.get("is_active", True):
         raise HTTPException(status_code=403, detail="Compte désactivé")
     
-    access_token = create_access_token(data={"sub": user["id"], "role": user["role"]})
+    access_token = create_access_token(data={"sub": user["id"], "role": user["role"], **principal_claims(user)})
     
     user_response = UserResponse(**{k: v for k, v in user.items() if k != "password"})
     
-    # Créer une notification de connexion pour les admins
-    login_time = datetime.now(timezone.utc)
-    login_time_formatted = login_time.strftime("%d/%m/%Y à %H:%M")
-    user_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or user.get('email', 'Utilisateur')
-    
-    asyncio.create_task(create_admin_notification(
-        title=f"🔐 Nouvelle connexion: {user_name}",
-        message=f"{user_name} ({user.get('role', 'utilisateur')}) s'est connecté le {login_time_formatted}",
-        notification_type="info",
-        link=None
-    ))
+    # Notification de connexion pour les admins (regroupée par fenêtre)
+    login_digest.record(user, datetime.now(timezone.utc))
     
     # Si c'est un admin qui se connecte, envoyer les notifications de congés à venir
     if user.get("role") in ["admin", "super_admin"]:
-        asyncio.create_task(send_upcoming_leaves_notification(user["id"]))
+        task_runner.submit(send_upcoming_leaves_notification, user["id"])
     
     return TokenResponse(access_token=access_token, user=user_response)
 
 @auth_router.get("/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0, "password": 0})
+    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
     return user
 
 class PasswordChange(BaseModel):
@@ -549,15 +1518,16 @@ async def change_password(
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
     # Verify current password
-    if not verify_password(password_data.current_password, user["password"]):
+    if not await password_hasher.verify(password_data.current_password, user["password"]):
         raise HTTPException(status_code=400, detail="Mot de passe actuel incorrect")
     
     # Hash and update new password
-    hashed_password = get_password_hash(password_data.new_password)
+    hashed_password = await password_hasher.hash(password_data.new_password)
     await db.users.update_one(
         {"id": current_user["id"]},
         {"$set": {"password": hashed_password}}
     )
+    invalidate_user(current_user["id"])
     
     return {"message": "Mot de passe modifié avec succès"}
 
@@ -664,14 +1634,16 @@ async def reset_password(request: ResetPasswordRequest):
         raise HTTPException(status_code=400, detail="Lien de réinitialisation expiré")
     
     # Update password
-    hashed_password = get_password_hash(request.new_password)
-    result = await db.users.update_one(
+    hashed_password = await password_hasher.hash(request.new_password)
+    user = await db.users.find_one_and_update(
         {"email": reset_record["email"]},
-        {"$set": {"password": hashed_password}}
+        {"$set": {"password": hashed_password}},
+        projection={"_id": 0, "id": 1}
     )
     
-    if result.modified_count == 0:
+    if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    invalidate_user(user["id"])
     
     # Delete used token
     await db.password_resets.delete_one({"token": request.token})
@@ -693,16 +1665,115 @@ async def verify_reset_token(token: str):
     return {"valid": True, "email": reset_record["email"]}
 
 # ==================== EMPLOYEES ROUTES ====================
+EMPLOYEE_SEARCH_FIELDS = ["first_name", "last_name", "email", "position", "department"]
+# Ranking weights: names weigh more than the other fields
+EMPLOYEE_SEARCH_WEIGHTS = [("last_name", 4), ("first_name", 4), ("email", 2), ("position", 1), ("department", 1)]
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Lowercase and strip accents so "Hélène" and "helene" compare equal"""
+    decomposed = unicodedata.normalize("NFKD", str(value or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+def employee_search_tokens(employee: dict) -> List[str]:
+    """Precomputed search key stored on users: normalized words of the searchable fields"""
+    tokens = set()
+    for field in EMPLOYEE_SEARCH_FIELDS:
+        text = normalize_search_text(employee.get(field))
+        if not text:
+            continue
+        if field == "email":
+            tokens.add(text)
+        tokens.update(t for t in re.split(r"[^a-z0-9]+", text) if t)
+    return sorted(tokens)
+
+def employee_search_keys(employee: dict) -> dict:
+    """Search fields stored on users: search_tokens (matched) and search_rank (ranking and tie order only).
+    
+    search_rank.fields holds each word tagged with its field ("last_name:dupont"), search_rank.last_name
+    the normalized last name used to sort ties.
+    """
+    fields = set()
+    for field, _ in EMPLOYEE_SEARCH_WEIGHTS:
+        words = re.split(r"[^a-z0-9]+", normalize_search_text(employee.get(field)))
+        fields.update(f"{field}:{word}" for word in words if word)
+    return {
+        "search_tokens": employee_search_tokens(employee),
+        "search_rank": {"fields": sorted(fields), "last_name": normalize_search_text(employee.get("last_name"))}
+    }
+
+def employee_match_score(terms: List[str]) -> dict:
+    """Aggregation expression scoring a user: exact word > prefix, weighted per field (EMPLOYEE_SEARCH_WEIGHTS)"""
+    scores = []
+    for field, weight in EMPLOYEE_SEARCH_WEIGHTS:
+        for term in terms:
+            tagged = f"{field}:{term}"
+            is_prefix = {"$gt": [{"$size": {"$filter": {
+                "input": "$search_rank.fields", "as": "word", "cond": {"$eq": [{"$indexOfCP": ["$$word", tagged]}, 0]}
+            }}}, 0]}
+            scores.append({"$cond": [{"$in": [tagged, "$search_rank.fields"]}, 3 * weight, {"$cond": [is_prefix, weight, 0]}]})
+    return {"$add": scores}
+
+EMPLOYEE_SORT_FIELDS = ["last_name", "first_name", "email", "created_at", "hierarchy_level"]
+EMPLOYEE_PAGE_MAX_LIMIT = 1000
+
+def encode_employee_cursor(sort: str, order: str, employee: dict) -> str:
+    payload = json.dumps({"s": sort, "o": order, "v": employee.get(sort), "id": employee["id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_employee_cursor(cursor: str, sort: str, order: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if data["s"] != sort or data["o"] != order or not isinstance(data["id"], str):
+            raise ValueError("cursor does not match sort")
+        return data
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+def employee_keyset_filter(sort: str, order: str, cursor: dict) -> dict:
+    """Match the rows strictly after the cursor position in (sort, id) order.
+    
+    Mongo sorts null/missing values first ascending and last descending, and range operators
+    never match them, so null cursors and the null tail are handled explicitly.
+    """
+    op = "$gt" if order == "asc" else "$lt"
+    value = cursor["v"]
+    same_value = {sort: value, "id": {op: cursor["id"]}}
+    if value is None:
+        if order == "asc":
+            return {"$or": [same_value, {sort: {"$ne": None}}]}
+        return same_value
+    branches = [{sort: {op: value}}, same_value]
+    if order == "desc":
+        branches.append({sort: None})
+    return {"$or": branches}
+
 @employees_router.get("")
 async def list_employees(
     department: Optional[str] = None,
     category: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    site_id: Optional[str] = None,
+    hierarchy_level: Optional[str] = None,
+    sort: str = "last_name",
+    order: str = "asc",
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    """List employees, keyset-paginated on (sort field, id) with an opaque cursor"""
+    projection = EMPLOYEE_FIELDS.projection(fields)
     # Employees can only see themselves
     if current_user["role"] == "employee":
-        user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0, "password": 0})
-        return {"employees": [user], "total": 1}
+        user = await db.users.find_one({"id": current_user["id"]}, projection)
+        return {"employees": [user], "total": 1, "next_cursor": None}
+    
+    if sort not in EMPLOYEE_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Tri invalide. Valeurs possibles: {', '.join(EMPLOYEE_SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Ordre invalide (asc ou desc)")
+    limit = max(1, min(limit, EMPLOYEE_PAGE_MAX_LIMIT))
     
     # Secretary can see employees in their department only
     query = {}
@@ -713,9 +1784,72 @@ async def list_employees(
         query["department"] = department
     if category:
         query["category"] = category
+    if is_active is not None:
+        query["is_active"] = is_active
+    if site_id:
+        query["site_id"] = site_id
+    if hierarchy_level:
+        query["hierarchy_level"] = hierarchy_level
+    
+    page_query = query
+    if cursor:
+        page_query = {"$and": [query, employee_keyset_filter(sort, order, decode_employee_cursor(cursor, sort, order))]}
+    
+    direction = 1 if order == "asc" else -1
+    # Unfiltered lists use the collection metadata count instead of scanning
+    total_coro = db.users.count_documents(query) if query else db.users.estimated_document_count()
+    employees, total = await asyncio.gather(
+        db.users.find(page_query, {**projection, sort: 1} if projection.get("id") == 1 else projection)
+            .sort([(sort, direction), ("id", direction)])
+            .limit(limit + 1)
+            .to_list(limit + 1),
+        total_coro
+    )
+    
+    next_cursor = None
+    if len(employees) > limit:
+        employees = employees[:limit]
+        next_cursor = encode_employee_cursor(sort, order, employees[-1])
+    
+    return {"employees": employees, "total": total, "next_cursor": next_cursor, "limit": limit}
+
+@employees_router.get("/search")
+async def search_employees(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """Prefix, case- and accent-insensitive search on name, email, position and department"""
+    terms = [t for t in re.split(r"[^a-z0-9@.]+", normalize_search_text(q)) if t]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Terme de recherche requis")
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    
+    # Every term must prefix one of the stored tokens (anchored regex -> index range scan)
+    query = {"$and": [{"search_tokens": {"$regex": f"^{re.escape(term)}"}} for term in terms]}
+    if current_user["role"] == "employee":
+        query["id"] = current_user["id"]
+    elif current_user["role"] == "secretary":
+        query["department"] = current_user.get("department")
     
-    employees = await db.users.find(query, {"_id": 0, "password": 0}).to_list(500)
-    return {"employees": employees, "total": len(employees)}
+    total = await db.users.count_documents(query)
+    pipeline = [
+        {"$match": query},
+        {"$addFields": {"_score": employee_match_score(terms)}},
+        {"$sort": {"_score": -1, "search_rank.last_name": 1, "id": 1}},
+        {"$skip": offset},
+        {"$limit": limit},
+        {"$project": {**EMPLOYEE_FIELDS.projection(None), "_score": 0}}
+    ]
+    employees = await db.users.aggregate(pipeline).to_list(limit)
+    return {
+        "employees": employees,
+        "total": total,
+        "offset": offset,
+        "limit": limit
+    }
 
 @employees_router.post("", status_code=status.HTTP_201_CREATED)
 async def create_employee(
@@ -727,16 +1861,25 @@ async def create_employee(
     if existing:
         raise HTTPException(status_code=400, detail="Email déjà enregistré")
     
-    user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(employee.password)
+    hashed_password = await password_hasher.hash(employee.password)
     
     # Get default leave rules
-    leave_rules = await db.leave_rules.find_one({"type": "default"}, {"_id": 0})
-    if not leave_rules:
-        leave_rules = LeaveRuleConfig().model_dump()
+    leave_rules = await config_cache.leave_rules()
+    
+    user_doc = build_employee_doc(employee, hashed_password, leave_rules, current_user["id"])
     
+    await db.users.insert_one(user_doc)
+    await open_leave_ledger([user_doc])
+    user_doc.pop("_id", None)
+    user_doc.pop("password", None)
+    user_doc.pop("search_tokens", None)
+    user_doc.pop("search_rank", None)
+    return user_doc
+
+def build_employee_doc(employee: UserCreate, hashed_password: str, leave_rules: dict, created_by: str) -> dict:
+    """Build the users document for an employee created by admin/secretary"""
     user_doc = {
-        "id": user_id,
+        "id": str(uuid.uuid4()),
         "email": employee.email,
         "password": hashed_password,
         "first_name": employee.first_name,
@@ -755,7 +1898,7 @@ async def create_employee(
         "is_active": True,
         "status": "active",
         "created_at": datetime.now(timezone.utc).isoformat(),
-        "created_by": current_user["id"],
+        "created_by": created_by,
         "avatar_url": None,
         "leave_balance": {
             "annual": leave_rules.get("annual_days", 26),
@@ -770,19 +1913,170 @@ async def create_employee(
             "maternity": 0
         }
     }
-    
-    await db.users.insert_one(user_doc)
-    user_doc.pop("_id", None)
-    user_doc.pop("password", None)
+    user_doc.update(employee_search_keys(user_doc))
+    user_doc["ledger_opened_at"] = user_doc["created_at"]
     return user_doc
 
+# ==================== BULK EMPLOYEE IMPORT ====================
+EMPLOYEE_IMPORT_BATCH_SIZE = int(os.environ.get('EMPLOYEE_IMPORT_BATCH_SIZE', '500'))
+# Case-insensitive email comparison (backed by the "email_ci" index)
+EMAIL_COLLATION = {"locale": "en", "strength": 2}
+
+def _normalize_import_header(header) -> str:
+    return str(header or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+def _normalize_import_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+def iter_csv_rows(file_obj):
+    """Yield (row_number, dict) from a CSV upload without loading it in memory"""
+    text = io.TextIOWrapper(file_obj, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    headers = [_normalize_import_header(h) for h in next(reader, [])]
+    for row_number, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        yield row_number, {h: _normalize_import_value(v) for h, v in zip(headers, values) if h}
+
+def iter_xlsx_rows(file_obj):
+    """Yield (row_number, dict) from the first sheet of an .xlsx upload (read-only mode)"""
+    workbook = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = [_normalize_import_header(h) for h in next(rows, [])]
+        for row_number, values in enumerate(rows, start=2):
+            if not any(v is not None and str(v).strip() for v in values):
+                continue
+            yield row_number, {h: _normalize_import_value(v) for h, v in zip(headers, values) if h}
+    finally:
+        workbook.close()
+
+async def _import_employee_batch(batch: List[tuple], leave_rules: dict, created_by: str, seen_emails: set, report: dict):
+    """Validate, de-duplicate, hash and insert one batch of imported rows"""
+    valid = []
+    for row_number, employee in batch:
+        email = employee.email.lower()
+        if email in seen_emails:
+            report["errors"].append({"row": row_number, "email": employee.email, "errors": ["Email en double dans le fichier"]})
+            continue
+        seen_emails.add(email)
+        valid.append((row_number, employee))
+    
+    if not valid:
+        return
+    
+    # One case-insensitive $in lookup for the whole batch instead of one find_one per employee
+    existing = await db.users.find(
+        {"email": {"$in": [employee.email for _, employee in valid]}},
+        {"_id": 0, "email": 1},
+        collation=EMAIL_COLLATION
+    ).to_list(None)
+    existing_emails = {u["email"].lower() for u in existing}
+    
+    to_create = []
+    for row_number, employee in valid:
+        if employee.email.lower() in existing_emails:
+            report["errors"].append({"row": row_number, "email": employee.email, "errors": ["Email déjà enregistré"]})
+        else:
+            to_create.append((row_number, employee))
+    
+    if not to_create:
+        return
+    
+    hashes = await password_hasher.hash_many([employee.password for _, employee in to_create])
+    docs = [
+        build_employee_doc(employee, hashed, leave_rules, created_by)
+        for (_, employee), hashed in zip(to_create, hashes)
+    ]
+    
+    failed_indexes = {}
+    try:
+        await db.users.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed_indexes[error["index"]] = "Email déjà enregistré" if error.get("code") == 11000 else error.get("errmsg", "Erreur d'insertion")
+    
+    for index, (row_number, employee) in enumerate(to_create):
+        if index in failed_indexes:
+            report["errors"].append({"row": row_number, "email": employee.email, "errors": [failed_indexes[index]]})
+        else:
+            report["created"] += 1
+    await open_leave_ledger([doc for index, doc in enumerate(docs) if index not in failed_indexes])
+
+@employees_router.post("/import")
+async def import_employees(
+    file: UploadFile = File(...),
+    default_password: Optional[str] = Form(None),
+    current_user: dict = Depends(require_roles(["admin", "secretary"]))
+):
+    """Bulk-create employees from a CSV or XLSX file (one row per employee, UserCreate columns)"""
+    filename = (file.filename or "").lower()
+    if filename.endswith(".csv"):
+        rows = iter_csv_rows(file.file)
+    elif filename.endswith(".xlsx"):
+        rows = iter_xlsx_rows(file.file)
+    else:
+        raise HTTPException(status_code=400, detail="Format non supporté. Utilisez un fichier CSV ou XLSX.")
+    
+    leave_rules = await config_cache.leave_rules()
+    
+    report = {"total_rows": 0, "created": 0, "errors": []}
+    seen_emails = set()
+    batch = []
+    
+    try:
+        for row_number, row in rows:
+            report["total_rows"] += 1
+            row = {k: v for k, v in row.items() if v is not None}
+            if "password" not in row and default_password:
+                row["password"] = default_password
+            try:
+                employee = UserCreate(**row)
+            except ValidationError as e:
+                report["errors"].append({
+                    "row": row_number,
+                    "email": row.get("email"),
+                    "errors": [f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()]
+                })
+                continue
+            batch.append((row_number, employee))
+            if len(batch) >= EMPLOYEE_IMPORT_BATCH_SIZE:
+                await _import_employee_batch(batch, leave_rules, current_user["id"], seen_emails, report)
+                batch = []
+        if batch:
+            await _import_employee_batch(batch, leave_rules, current_user["id"], seen_emails, report)
+    except (csv.Error, UnicodeDecodeError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Fichier illisible: {str(e)}")
+    
+    report["failed"] = len(report["errors"])
+    report["errors"].sort(key=lambda err: err["row"])
+    return {
+        "message": f"{report['created']} employé(s) importé(s), {report['failed']} ligne(s) en erreur",
+        **report
+    }
+
 @employees_router.get("/{employee_id}")
 async def get_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
     # Employees can only view themselves
     if current_user["role"] == "employee" and current_user["id"] != employee_id:
         raise HTTPException(status_code=403, detail="Accès refusé")
     
-    employee = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0})
+    employee = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
     if not employee:
         raise HTTPException(status_code=404, detail="Employé non trouvé")
     
@@ -800,6 +2094,53 @@ async def get_employee(employee_id: str, current_user: dict = Depends(get_curren
     
     return employee
 
+PROFILE_SECTION_LIMIT = 20
+PROFILE_SECTION_MAX_LIMIT = 100
+
+@employees_router.get("/{employee_id}/profile")
+async def get_employee_profile(
+    employee_id: str,
+    limit: int = PROFILE_SECTION_LIMIT,
+    current_user: dict = Depends(get_current_user)
+):
+    """Composite profile: employee (+ site, group) and recent leaves, behaviors, documents, HR actions"""
+    # Same rule as every per-employee endpoint: employees can only view themselves
+    if current_user["role"] == "employee" and current_user["id"] != employee_id:
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    limit = max(1, min(limit, PROFILE_SECTION_MAX_LIMIT))
+    
+    employee_pipeline = [
+        {"$match": {"id": employee_id}},
+        {"$limit": 1},
+        {"$lookup": {"from": "sites", "localField": "site_id", "foreignField": "id", "as": "_site"}},
+        {"$lookup": {"from": "hierarchical_groups", "localField": "hierarchical_group_id", "foreignField": "id", "as": "_group"}},
+        {"$addFields": {
+            "site_name": {"$arrayElemAt": ["$_site.name", 0]},
+            "hierarchical_group_name": {"$arrayElemAt": ["$_group.name", 0]}
+        }},
+        {"$project": {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0, "_site": 0, "_group": 0}}
+    ]
+    
+    # The sections only depend on employee_id, so all five queries run concurrently
+    employees, leaves, behaviors, documents, hr_actions = await asyncio.gather(
+        db.users.aggregate(employee_pipeline).to_list(1),
+        db.leaves.find({"employee_id": employee_id}, LEAVE_FIELDS.projection(None)).sort("created_at", -1).to_list(limit),
+        db.behaviors.find({"employee_id": employee_id}, {"_id": 0}).sort("date", -1).to_list(limit),
+        db.documents.find({"employee_id": employee_id}, {"_id": 0}).sort("uploaded_at", -1).to_list(limit),
+        db.hr_actions.find({"employee_id": employee_id}, {"_id": 0}).sort("created_at", -1).to_list(limit)
+    )
+    if not employees:
+        raise HTTPException(status_code=404, detail="Employé non trouvé")
+    
+    return {
+        "employee": employees[0],
+        "leaves": leaves,
+        "behaviors": behaviors,
+        "documents": documents,
+        "hr_actions": hr_actions,
+        "limit": limit
+    }
+
 @employees_router.put("/{employee_id}")
 async def update_employee(
     employee_id: str,
@@ -808,10 +2149,18 @@ async def update_employee(
 ):
     update_data = {k: v for k, v in updates.model_dump().items() if v is not None}
     
+    if set(update_data) & set(EMPLOYEE_SEARCH_FIELDS):
+        current = await db.users.find_one({"id": employee_id}, {"_id": 0, **{f: 1 for f in EMPLOYEE_SEARCH_FIELDS}})
+        if current:
+            update_data.update(employee_search_keys({**current, **update_data}))
+    
     if update_data:
         await db.users.update_one({"id": employee_id}, {"$set": update_data})
+        invalidate_user(employee_id)
+        if set(update_data) & set(PRINCIPAL_CLAIM_FIELDS):
+            await revocation_list.revoke(employee_id, "claims_changed")
     
-    employee = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0})
+    employee = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
     if not employee:
         raise HTTPException(status_code=404, detail="Employé non trouvé")
     return employee
@@ -828,24 +2177,529 @@ async def delete_employee(
         raise HTTPException(status_code=404, detail="Employé non trouvé")
     
     if permanent:
-        # Permanent deletion - also delete related data
+        # Permanent deletion - the account goes now, related data is purged in the background
         await db.users.delete_one({"id": employee_id})
-        await db.leaves.delete_many({"employee_id": employee_id})
-        await db.behaviors.delete_many({"employee_id": employee_id})
-        await db.documents.delete_many({"employee_id": employee_id})
-        await db.attendance.delete_many({"employee_id": employee_id})
-        return {"message": "Employé supprimé définitivement"}
+        invalidate_user(employee_id)
+        await revocation_list.revoke(employee_id, "deleted")
+        job = await background_jobs.enqueue(
+            "employee_purge",
+            {"employee_id": employee_id, "email": employee.get("email"), "avatar_url": employee.get("avatar_url")},
+            current_user["id"]
+        )
+        return {"message": "Employé supprimé définitivement", "job_id": job["id"]}
     else:
         # Soft delete - just deactivate
         await db.users.update_one({"id": employee_id}, {"$set": {"is_active": False, "status": "inactive"}})
+        invalidate_user(employee_id)
+        await revocation_list.revoke(employee_id, "deactivated")
         return {"message": "Employé désactivé"}
 
+EMPLOYEE_PURGE_BATCH_SIZE = int(os.environ.get('EMPLOYEE_PURGE_BATCH_SIZE', '500'))
+
+def employee_purge_targets(employee_id: str, email: Optional[str]) -> List[tuple]:
+    """Every (collection, filter) holding data that belongs to an employee"""
+    targets = [
+        ("leaves", {"employee_id": employee_id}),
+        ("leave_ledger", {"employee_id": employee_id}),
+        ("calendar", {"employee_id": employee_id}),
+        ("behaviors", {"employee_id": employee_id}),
+        # Only documents about the employee: those they authored (company documents) are kept
+        ("documents", {"employee_id": employee_id}),
+        ("hr_documents", {"employee_id": employee_id}),
+        ("hr_actions", {"employee_id": employee_id}),
+        ("attendance", {"employee_id": employee_id}),
+        ("notifications", {"user_id": employee_id}),
+        ("chat_messages", {"$or": [{"sender_id": employee_id}, {"recipient_id": employee_id}]}),
+        ("signature_passwords", {"user_id": employee_id}),
+        ("signature_settings", {"user_id": employee_id}),
+    ]
+    if email:
+        targets.append(("password_resets", {"email": email}))
+    return targets
+
+def upload_filename(url: Optional[str]) -> Optional[str]:
+    """File name in UPLOAD_DIR for an /api/uploads/... URL, None for anything else"""
+    if not url or not url.startswith("/api/uploads/"):
+        return None
+    return os.path.basename(url) or None
+
+def remove_upload_files(filenames: set) -> int:
+    removed = 0
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(UPLOAD_DIR, filename))
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove upload {filename}: {e}")
+    return removed
+
+@background_jobs.handler("employee_purge")
+async def purge_employee_data(job: dict) -> dict:
+    """Delete everything referencing a permanently deleted employee, batch by batch"""
+    employee_id = job["params"]["employee_id"]
+    
+    # Collect uploaded files before the documents referencing them are deleted
+    filenames = {upload_filename(job["params"].get("avatar_url"))}
+    async for doc in db.documents.find({"employee_id": employee_id}, {"_id": 0, "url": 1}):
+        filenames.add(upload_filename(doc.get("url")))
+    async for behavior in db.behaviors.find({"employee_id": employee_id}, {"_id": 0, "file_url": 1, "document_urls": 1}):
+        filenames.add(upload_filename(behavior.get("file_url")))
+        filenames.update(upload_filename(url) for url in behavior.get("document_urls") or [])
+    filenames.update(path.name for path in Path(UPLOAD_DIR).glob(f"avatar_{employee_id}_*"))
+    filenames.discard(None)
+    
+    deleted = {}
+    for collection, query in employee_purge_targets(employee_id, job["params"].get("email")):
+        deleted[collection] = 0
+        while True:
+            batch = await db[collection].find(query, {"_id": 1}).limit(EMPLOYEE_PURGE_BATCH_SIZE).to_list(EMPLOYEE_PURGE_BATCH_SIZE)
+            if not batch:
+                break
+            result = await db[collection].delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+            deleted[collection] += result.deleted_count
+            await background_jobs.progress(job["id"], collection=collection, deleted=deleted)
+    
+    if deleted.get("leaves"):
+        await leaves_changed()
+        await absence_rollup.remove_employee(employee_id)
+    files_deleted = await asyncio.to_thread(remove_upload_files, filenames)
+    await background_jobs.progress(job["id"], collection=None, files_deleted=files_deleted)
+    return {"deleted": deleted, "files_deleted": files_deleted}
+
+# ==================== LEAVE LEDGER ====================
+# Append-only record of every grant, consumption and reversal of leave days.
+# users.leave_balance / users.leave_taken are the O(1) projection of this ledger:
+# an entry only moves the counters if it was inserted (unique key), so retries
+# and concurrent requests cannot apply the same movement twice.
+
+def leave_ledger_entry(employee_id: str, leave_type: str, kind: str, key: str, granted: int = 0, taken: int = 0,
+                       year: Optional[int] = None, leave_id: Optional[str] = None, created_by: Optional[str] = None) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "key": key,
+        "employee_id": employee_id,
+        "leave_type": leave_type,
+        "year": year or datetime.now(timezone.utc).year,
+        "kind": kind,  # opening, grant, consume, reverse, adjust
+        "granted": granted,
+        "taken": taken,
+        "leave_id": leave_id,
+        "created_by": created_by,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+def leave_year(leave: dict) -> Optional[int]:
+    try:
+        return int(leave["start_date"][:4])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+async def apply_leave_ledger(entries: List[dict], project: bool = True) -> int:
+    """Insert ledger entries (duplicates by key are skipped) and $inc the user counters for the new ones"""
+    if not entries:
+        return 0
+    failed = set()
+    try:
+        await db.leave_ledger.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+    applied = [entry for index, entry in enumerate(entries) if index not in failed]
+    
+    if project and applied:
+        updates = []
+        for entry in applied:
+            inc = {}
+            if entry["granted"]:
+                inc[f"leave_balance.{entry['leave_type']}"] = entry["granted"]
+            if entry["taken"]:
+                inc[f"leave_taken.{entry['leave_type']}"] = entry["taken"]
+            if inc:
+                updates.append(UpdateOne({"id": entry["employee_id"]}, {"$inc": inc}))
+        if updates:
+            await db.users.bulk_write(updates, ordered=False)
+        invalidate_user(*{entry["employee_id"] for entry in applied})
+    return len(applied)
+
+def opening_ledger_entries(user: dict) -> List[dict]:
+    """Opening entries matching the counters already stored on a user document"""
+    balance = user.get("leave_balance") or {}
+    taken = user.get("leave_taken") or {}
+    return [
+        leave_ledger_entry(
+            user["id"], leave_type, "opening", f"opening:{user['id']}:{leave_type}",
+            granted=balance.get(leave_type, 0) or 0, taken=taken.get(leave_type, 0) or 0
+        )
+        for leave_type in sorted(set(balance) | set(taken))
+    ]
+
+async def open_leave_ledger(users: List[dict]):
+    """Record opening balances for newly created users (their counters are already set)"""
+    entries = [entry for user in users for entry in opening_ledger_entries(user)]
+    await apply_leave_ledger(entries, project=False)
+
+async def backfill_leave_ledger():
+    """Opening-balance migration for users created before the ledger existed"""
+    opened_at = datetime.now(timezone.utc).isoformat()
+    cursor = db.users.find(
+        {"ledger_opened_at": {"$exists": False}},
+        {"_id": 0, "id": 1, "leave_balance": 1, "leave_taken": 1}
+    ).batch_size(500)
+    batch = []
+    async for user in cursor:
+        batch.append(user)
+        if len(batch) >= 500:
+            await open_leave_ledger(batch)
+            await db.users.update_many({"id": {"$in": [u["id"] for u in batch]}}, {"$set": {"ledger_opened_at": opened_at}})
+            batch = []
+    if batch:
+        await open_leave_ledger(batch)
+        await db.users.update_many({"id": {"$in": [u["id"] for u in batch]}}, {"$set": {"ledger_opened_at": opened_at}})
+
+@background_jobs.handler("leave_ledger_reconcile")
+async def reconcile_leave_balances(job: dict) -> dict:
+    """Rebuild every user's leave_balance/leave_taken from the ledger with a single $group"""
+    totals = await db.leave_ledger.aggregate([
+        {"$group": {
+            "_id": {"employee_id": "$employee_id", "leave_type": "$leave_type"},
+            "granted": {"$sum": "$granted"},
+            "taken": {"$sum": "$taken"}
+        }}
+    ]).to_list(None)
+    
+    by_employee = {}
+    for total in totals:
+        fields = by_employee.setdefault(total["_id"]["employee_id"], {})
+        fields[f"leave_balance.{total['_id']['leave_type']}"] = total["granted"]
+        fields[f"leave_taken.{total['_id']['leave_type']}"] = total["taken"]
+    
+    summary = {"employees": len(by_employee), "corrected": 0}
+    employee_ids = list(by_employee)
+    for i in range(0, len(employee_ids), 500):
+        chunk = employee_ids[i:i + 500]
+        users = await db.users.find(
+            {"id": {"$in": chunk}},
+            {"_id": 0, "id": 1, "leave_balance": 1, "leave_taken": 1}
+        ).to_list(len(chunk))
+        drifted = []
+        for user in users:
+            expected = by_employee[user["id"]]
+            current = {
+                f"{field}.{leave_type}": value
+                for field in ("leave_balance", "leave_taken")
+                for leave_type, value in (user.get(field) or {}).items()
+            }
+            if any(current.get(path, 0) != value for path, value in expected.items()):
+                drifted.append(user["id"])
+        if drifted:
+            await db.users.bulk_write([UpdateOne({"id": uid}, {"$set": by_employee[uid]}) for uid in drifted], ordered=False)
+            invalidate_user(*drifted)
+            summary["corrected"] += len(drifted)
+        await background_jobs.progress(job["id"], processed=min(i + 500, len(employee_ids)), **summary)
+    return summary
+
+@leaves_router.post("/ledger/reconcile")
+async def start_leave_ledger_reconcile(current_user: dict = Depends(require_roles(["admin"]))):
+    """Rebuild all balances from the leave ledger in the background"""
+    job = await background_jobs.enqueue("leave_ledger_reconcile", {}, current_user["id"])
+    return {"message": "Réconciliation des soldes en cours", "job_id": job["id"]}
+
+@leaves_router.get("/ledger/{employee_id}")
+async def get_leave_ledger(
+    employee_id: str,
+    year: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Ledger entries and per-type totals of an employee (optionally one year)"""
+    if current_user["role"] == "employee" and current_user["id"] != employee_id:
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    query = {"employee_id": employee_id}
+    if year:
+        query["year"] = year
+    entries, totals = await asyncio.gather(
+        db.leave_ledger.find(query, {"_id": 0}).sort("created_at", -1).to_list(500),
+        db.leave_ledger.aggregate([
+            {"$match": query},
+            {"$group": {"_id": "$leave_type", "granted": {"$sum": "$granted"}, "taken": {"$sum": "$taken"}}}
+        ]).to_list(None)
+    )
+    return {
+        "entries": entries,
+        "totals": {t["_id"]: {"granted": t["granted"], "taken": t["taken"], "remaining": t["granted"] - t["taken"]} for t in totals}
+    }
+
+# ==================== LEAVE STATISTICS ====================
+LEAVE_STATS_CACHE_TTL_SECONDS = float(os.environ.get('LEAVE_STATS_CACHE_TTL_SECONDS', '30'))
+
+leave_stats_cache = TTLCache(max_size=256, ttl_seconds=LEAVE_STATS_CACHE_TTL_SECONDS)
+
+async def leaves_changed(*leaves: dict):
+    """Hook awaited after every write to db.leaves: drop caches derived from leaves, bump the feeds version.
+    
+    Pass the leaves whose approved days may have moved so the absence rollup refreshes their buckets.
+    """
+    leave_stats_cache.clear()
+    await calendar_state.changed()
+    if leaves:
+        absence_rollup.schedule(leaves)
+
+async def compute_leave_stats(employee_id: Optional[str] = None, year: Optional[int] = None, department: Optional[str] = None) -> dict:
+    """Counts by status, type, department and month in one $facet aggregation (cached briefly)"""
+    cache_key = (employee_id, year, department)
+    cached = leave_stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    match = {}
+    if employee_id:
+        match["employee_id"] = employee_id
+    if department:
+        match["department"] = department
+    if year:
+        match.update(date_overlap_query(datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year, 12, 31, tzinfo=timezone.utc)))
+    
+    facets = await db.leaves.aggregate([
+        {"$match": match},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "by_type": [{"$group": {"_id": "$leave_type", "count": {"$sum": 1}, "days": {"$sum": "$working_days"}}}],
+            "by_department": [{"$group": {"_id": "$department", "count": {"$sum": 1}}}],
+            "by_month": [
+                {"$group": {"_id": {"$substr": ["$start_date", 0, 7]}, "count": {"$sum": 1}}},
+                {"$sort": {"_id": 1}}
+            ]
+        }}
+    ]).to_list(1)
+    facets = facets[0] if facets else {}
+    
+    by_status = {f["_id"]: f["count"] for f in facets.get("by_status", []) if f["_id"]}
+    stats = {
+        "pending": by_status.get("pending", 0),
+        "approved": by_status.get("approved", 0),
+        "rejected": by_status.get("rejected", 0),
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_type": {f["_id"]: {"count": f["count"], "days": f["days"]} for f in facets.get("by_type", []) if f["_id"]},
+        "by_department": {f["_id"]: f["count"] for f in facets.get("by_department", []) if f["_id"]},
+        "by_month": {f["_id"]: f["count"] for f in facets.get("by_month", []) if f["_id"]}
+    }
+    leave_stats_cache.set(cache_key, stats)
+    return stats
+
+# ==================== ABSENCE ROLLUP ====================
+ABSENCE_ROLLUP_MAX_DAYS = 366
+
+def absence_days(leave: dict, range_start: Optional[str] = None, range_end: Optional[str] = None) -> List[str]:
+    """YYYY-MM-DD days covered by a leave, optionally clipped to [range_start, range_end]"""
+    try:
+        first = date.fromisoformat(max(leave["start_date"], range_start or ""))
+        last = date.fromisoformat(min(leave.get("end_date") or leave["start_date"], range_end or "9999-12-31"))
+    except (KeyError, TypeError, ValueError):
+        return []
+    span = min((last - first).days + 1, ABSENCE_ROLLUP_MAX_DAYS)
+    return [(first + timedelta(days=i)).isoformat() for i in range(max(span, 0))]
+
+def requested_days(start_date: str, end_date: str) -> List[str]:
+    """Days of a [start_date, end_date] query range, 400 when malformed or longer than ABSENCE_ROLLUP_MAX_DAYS"""
+    if not native_date_range(start_date, end_date):
+        raise HTTPException(status_code=400, detail="Format de date invalide (YYYY-MM-DD)")
+    dates = absence_days({"start_date": start_date, "end_date": end_date})
+    if not dates or dates[-1] != end_date:
+        raise HTTPException(status_code=400, detail=f"Période invalide (maximum {ABSENCE_ROLLUP_MAX_DAYS} jours)")
+    return dates
+
+def absence_doc(day: str, department: Optional[str], site_id: Optional[str], employee_ids: set) -> dict:
+    return {"date": day, "department": department, "site_id": site_id, "count": len(employee_ids), "employee_ids": sorted(employee_ids)}
+
+ABSENCE_LEAVE_PROJECTION = {"_id": 0, "employee_id": 1, "department": 1, "site_id": 1, "start_date": 1, "end_date": 1}
+
+def older_absence_bucket(seq: int) -> dict:
+    """Filter on buckets written by an older snapshot than seq (or before buckets were sequenced)"""
+    return {"seq": {"$not": {"$gte": seq}}}
+
+class AbsenceRollup:
+    """db.absence_daily: one document per (date, department, site_id) with the employees on approved leave.
+    
+    Buckets touched by a leave are recomputed from db.leaves (so overlapping leaves of one employee
+    stay correct); rebuild() regenerates the whole collection. Each refresh takes a global sequence
+    number before reading db.leaves and a bucket only accepts a write from a newer snapshot, so
+    refreshes interleaved across workers cannot overwrite newer buckets with older ones.
+    """
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._pending: Dict[tuple, list] = {}
+        self._queued = False
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.failures = 0
+    
+    def schedule(self, leaves) -> None:
+        """Refresh in the background the (department, site) date spans covered by these leaves.
+        
+        Spans accumulate until the queued refresh runs, so a burst of writes costs one refresh.
+        """
+        for leave in leaves:
+            days = absence_days(leave)
+            if not days:
+                continue
+            key = (leave.get("department"), leave.get("site_id"))
+            span = self._pending.setdefault(key, [days[0], days[-1]])
+            span[0], span[1] = min(span[0], days[0]), max(span[1], days[-1])
+        if self._pending and not self._queued:
+            # If the task queue is full the spans stay pending until the next write
+            self._queued = task_runner.submit(self._flush, name="absence_rollup")
+    
+    async def _flush(self) -> None:
+        self._queued = False
+        spans, self._pending = self._pending, {}
+        await self.refresh(spans)
+    
+    async def refresh(self, spans: Dict[tuple, list]) -> None:
+        async with self._lock:
+            try:
+                for (department, site_id), (range_start, range_end) in spans.items():
+                    await self._refresh_span(department, site_id, range_start, range_end)
+                self.refreshes += 1
+            except Exception:
+                self.failures += 1
+                logger.exception("Absence rollup refresh failed")
+    
+    async def _next_seq(self) -> int:
+        state = await db.config_state.find_one_and_update(
+            {"id": "absence_rollup"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return state["seq"]
+    
+    async def _write(self, operations: list) -> None:
+        try:
+            await db.absence_daily.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A duplicate key on upsert means a newer snapshot already owns the bucket
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+    
+    def _bucket_write(self, day: str, department: Optional[str], site_id: Optional[str], ids: set, seq: int) -> ReplaceOne:
+        return ReplaceOne(
+            {"date": day, "department": department, "site_id": site_id, **older_absence_bucket(seq)},
+            {**absence_doc(day, department, site_id, ids), "seq": seq},
+            upsert=True
+        )
+    
+    async def _refresh_span(self, department: Optional[str], site_id: Optional[str], range_start: str, range_end: str) -> None:
+        seq = await self._next_seq()
+        query = {
+            "status": "approved", "department": department, "site_id": site_id,
+            **date_overlap_query(*native_date_range(range_start, range_end).values())
+        }
+        buckets: Dict[str, set] = {}
+        async for leave in db.leaves.find(query, ABSENCE_LEAVE_PROJECTION):
+            for day in absence_days(leave, range_start, range_end):
+                buckets.setdefault(day, set()).add(leave["employee_id"])
+        operations = [self._bucket_write(day, department, site_id, ids, seq) for day, ids in buckets.items()]
+        operations.append(DeleteMany({
+            "department": department, "site_id": site_id,
+            "date": {"$gte": range_start, "$lte": range_end, "$nin": list(buckets)},
+            **older_absence_bucket(seq)
+        }))
+        await self._write(operations)
+    
+    async def remove_employee(self, employee_id: str) -> None:
+        async with self._lock:
+            await db.absence_daily.update_many(
+                {"employee_ids": employee_id}, {"$pull": {"employee_ids": employee_id}, "$inc": {"count": -1}}
+            )
+            await db.absence_daily.delete_many({"count": {"$lte": 0}})
+    
+    async def rebuild(self) -> dict:
+        async with self._lock:
+            seq = await self._next_seq()
+            buckets: Dict[tuple, set] = {}
+            async for leave in db.leaves.find({"status": "approved"}, ABSENCE_LEAVE_PROJECTION):
+                for day in absence_days(leave):
+                    buckets.setdefault((day, leave.get("department"), leave.get("site_id")), set()).add(leave["employee_id"])
+            operations = [self._bucket_write(day, department, site_id, ids, seq) for (day, department, site_id), ids in buckets.items()]
+            for i in range(0, len(operations), 1000):
+                await self._write(operations[i:i + 1000])
+            # Every bucket of this snapshot now has seq >= this one: older ones have no approved leave left
+            await db.absence_daily.delete_many(older_absence_bucket(seq))
+            self.rebuilds += 1
+        return {"days": len(buckets)}
+    
+    def stats(self) -> dict:
+        return {"refreshes": self.refreshes, "rebuilds": self.rebuilds, "failures": self.failures, "pending": len(self._pending)}
+
+absence_rollup = AbsenceRollup()
+
+@background_jobs.handler("absence_rollup_rebuild")
+async def rebuild_absence_rollup(job: dict) -> dict:
+    return await absence_rollup.rebuild()
+
+@leaves_router.post("/absences/rebuild")
+async def start_absence_rollup_rebuild(current_user: dict = Depends(require_roles(["admin"]))):
+    """Regenerate the daily absence rollup from approved leaves in the background"""
+    job = await background_jobs.enqueue("absence_rollup_rebuild", {}, current_user["id"])
+    return {"message": "Reconstruction des absences journalières en cours", "job_id": job["id"]}
+
+@leaves_router.get("/absences")
+async def get_absence_heatmap(
+    start_date: str,
+    end_date: str,
+    department: Optional[str] = None,
+    site_id: Optional[str] = None,
+    group_by: str = "department",
+    include_employees: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Daily absence counts per department/site over a date range, as compact arrays for a heatmap"""
+    dates = requested_days(start_date, end_date)
+    group_fields = {"department": ("department",), "site": ("site_id",), "department_site": ("department", "site_id")}.get(group_by)
+    if not group_fields:
+        raise HTTPException(status_code=400, detail="group_by doit être department, site ou department_site")
+    
+    query = {"date": {"$gte": start_date, "$lte": end_date}}
+    if department is not None:
+        query["department"] = department
+    if site_id is not None:
+        query["site_id"] = site_id
+    projection = {"_id": 0} if include_employees else {"_id": 0, "employee_ids": 0}
+    
+    index = {day: i for i, day in enumerate(dates)}
+    rows: Dict[tuple, dict] = {}
+    totals = [0] * len(dates)
+    async for doc in db.absence_daily.find(query, projection):
+        key = tuple(doc.get(f) for f in group_fields)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {**dict(zip(group_fields, key)), "counts": [0] * len(dates)}
+            if include_employees:
+                row["employee_ids"] = [[] for _ in dates]
+        i = index[doc["date"]]
+        if include_employees:
+            merged = set(row["employee_ids"][i]) | set(doc["employee_ids"])
+            totals[i] += len(merged) - row["counts"][i]
+            row["counts"][i] = len(merged)
+            row["employee_ids"][i] = sorted(merged)
+        else:
+            row["counts"][i] += doc["count"]
+            totals[i] += doc["count"]
+    
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "group_by": group_by,
+        "dates": dates,
+        "rows": sorted(rows.values(), key=lambda r: tuple(str(r.get(f) or "") for f in group_fields)),
+        "totals": totals
+    }
+
 # ==================== LEAVE MANAGEMENT ROUTES ====================
 @leaves_router.get("")
 async def list_leaves(
     status: Optional[str] = None,
     leave_type: Optional[str] = None,
     employee_id: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -862,21 +2716,18 @@ async def list_leaves(
     if leave_type:
         query["leave_type"] = leave_type
     
-    leaves = await db.leaves.find(query, {"_id": 0}).sort("created_at", -1).to_list(500)
+    leaves = await db.leaves.find(query, LEAVE_FIELDS.projection(fields)).sort("created_at", -1).to_list(500)
     return {"leaves": leaves}
 
 @leaves_router.get("/stats")
-async def get_leave_stats(current_user: dict = Depends(get_current_user)):
-    """Get leave statistics"""
-    query = {}
-    if current_user["role"] == "employee":
-        query["employee_id"] = current_user["id"]
-    
-    pending = await db.leaves.count_documents({**query, "status": "pending"})
-    approved = await db.leaves.count_documents({**query, "status": "approved"})
-    rejected = await db.leaves.count_documents({**query, "status": "rejected"})
-    
-    return {"pending": pending, "approved": approved, "rejected": rejected}
+async def get_leave_stats(
+    year: Optional[int] = None,
+    department: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get leave statistics (by status, type, department and month)"""
+    employee_id = current_user["id"] if current_user["role"] == "employee" else None
+    return await compute_leave_stats(employee_id, year, department)
 
 @leaves_router.get("/calendar")
 async def get_leaves_for_calendar(
@@ -891,33 +2742,17 @@ async def get_leaves_for_calendar(
     
     # ALL users see ALL approved leaves (for global calendar visibility)
     # This allows employees and admins to see when colleagues are on leave
-    query = {"status": "approved"}
-    
-    leaves = await db.leaves.find(query, {"_id": 0}).to_list(500)
+    month_start, month_end = month_range(target_year, target_month)
+    query = {"status": "approved", **date_overlap_query(month_start, month_end)}
     
-    # Filter by month
-    filtered = []
-    for leave in leaves:
-        try:
-            start = datetime.strptime(leave["start_date"], "%Y-%m-%d")
-            end = datetime.strptime(leave["end_date"], "%Y-%m-%d")
-            # Check if leave overlaps with target month
-            month_start = datetime(target_year, target_month, 1)
-            if target_month == 12:
-                month_end = datetime(target_year + 1, 1, 1) - timedelta(days=1)
-            else:
-                month_end = datetime(target_year, target_month + 1, 1) - timedelta(days=1)
-            
-            if start <= month_end and end >= month_start:
-                filtered.append(leave)
-        except:
-            pass
+    leaves = await db.leaves.find(query, {"_id": 0, "start_at": 0, "end_at": 0}).sort("start_at", 1).to_list(None)
     
-    return {"leaves": filtered, "month": target_month, "year": target_year}
+    return {"leaves": leaves, "month": target_month, "year": target_year}
 
 @leaves_router.post("", status_code=status.HTTP_201_CREATED)
 async def create_leave_request(
     leave: LeaveRequest,
+    background: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """Create leave request - NO VALIDATION, pure registration system"""
@@ -929,42 +2764,23 @@ async def create_leave_request(
         raise HTTPException(status_code=400, detail="Format de date invalide (YYYY-MM-DD)")
     
     # Calculate working days (no validation on duration)
-    working_days = calculate_working_days(leave.start_date, leave.end_date)
+    working_days = await working_days_between(leave.start_date, leave.end_date)
     
     # Admin/Secretary can create for others or for all employees
     can_create_for_others = current_user["role"] in ["admin", "secretary"]
     
     # For collective leaves - create for all employees
     if leave.for_all_employees and can_create_for_others:
-        all_employees = await db.users.find({"is_active": True}, {"_id": 0}).to_list(500)
-        created_leaves = []
-        
-        for emp in all_employees:
-            leave_id = str(uuid.uuid4())
-            leave_doc = {
-                "id": leave_id,
-                "employee_id": emp["id"],
-                "employee_name": f"{emp['first_name']} {emp['last_name']}",
-                "department": emp.get("department", ""),
-                "position": emp.get("position", ""),
-                "leave_type": leave.leave_type or "collective",
-                "start_date": leave.start_date,
-                "end_date": leave.end_date,
-                "working_days": working_days,
-                "reason": leave.reason,
-                "status": "approved",  # Auto-approved for collective
-                "is_collective": True,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "created_by": current_user["id"],
-                "admin_comment": "Congé collectif - appliqué à tous les employés",
-                "approved_by": current_user["id"],
-                "approved_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.leaves.insert_one(leave_doc)
-            leave_doc.pop("_id", None)
-            created_leaves.append(leave_doc)
+        if background:
+            job = await background_jobs.enqueue(
+                "collective_leave",
+                {"leave": leave.model_dump(), "working_days": working_days},
+                current_user["id"]
+            )
+            return {"message": "Création du congé collectif en cours", "job_id": job["id"]}
         
-        return {"message": f"Congé collectif créé pour {len(created_leaves)} employés", "count": len(created_leaves)}
+        summary = await create_collective_leaves(leave.model_dump(), working_days, current_user["id"])
+        return {"message": f"Congé collectif créé pour {summary['count']} employés", **summary}
     
     # Determine target employee
     if leave.employee_id and can_create_for_others:
@@ -975,11 +2791,13 @@ async def create_leave_request(
         target_name = f"{target_employee['first_name']} {target_employee['last_name']}"
         target_dept = target_employee.get("department", "")
         target_position = target_employee.get("position", "")
+        target_site = target_employee.get("site_id")
     else:
         target_id = current_user["id"]
         target_name = f"{current_user['first_name']} {current_user['last_name']}"
         target_dept = current_user.get("department", "")
         target_position = current_user.get("position", "")
+        target_site = current_user.get("site_id")
     
     # Create leave request - NO VALIDATIONS, pure data registration
     leave_id = str(uuid.uuid4())
@@ -989,11 +2807,13 @@ async def create_leave_request(
         "employee_name": target_name,
         "department": target_dept,
         "position": target_position,
+        "site_id": target_site,
         "leave_type": leave.leave_type,
         "start_date": leave.start_date,
         "end_date": leave.end_date,
         "working_days": working_days,
         "reason": leave.reason,
+        **native_date_range(leave.start_date, leave.end_date),
         "status": "pending",
         "created_at": datetime.now(timezone.utc).isoformat(),
         "created_by": current_user["id"] if leave.employee_id else None,
@@ -1003,9 +2823,199 @@ async def create_leave_request(
     }
     
     await db.leaves.insert_one(leave_doc)
+    await leaves_changed()
     leave_doc.pop("_id", None)
+    leave_doc.pop("start_at", None)
+    leave_doc.pop("end_at", None)
+    
+    await task_runner.put(notify_leave_overlaps, leave_doc)
     return leave_doc
 
+COLLECTIVE_LEAVE_CHUNK_SIZE = int(os.environ.get('COLLECTIVE_LEAVE_CHUNK_SIZE', '500'))
+
+async def create_collective_leaves(leave: dict, working_days: int, created_by: str, job_id: Optional[str] = None) -> dict:
+    """Create an approved leave for every active employee: streaming cursor + unordered insert_many chunks"""
+    now = datetime.now(timezone.utc).isoformat()
+    summary = {"count": 0, "failed": 0, "chunks": 0}
+    
+    async def flush(chunk):
+        try:
+            result = await db.leaves.insert_many(chunk, ordered=False)
+            summary["count"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            summary["count"] += e.details.get("nInserted", 0)
+            summary["failed"] += len(e.details.get("writeErrors", []))
+        await leaves_changed(*chunk)
+        summary["chunks"] += 1
+        if job_id:
+            await background_jobs.progress(job_id, **summary)
+    
+    chunk = []
+    cursor = db.users.find(
+        {"is_active": True},
+        {"_id": 0, "id": 1, "first_name": 1, "last_name": 1, "department": 1, "position": 1, "site_id": 1}
+    ).batch_size(COLLECTIVE_LEAVE_CHUNK_SIZE)
+    async for emp in cursor:
+        chunk.append({
+            "id": str(uuid.uuid4()),
+            "employee_id": emp["id"],
+            "employee_name": f"{emp['first_name']} {emp['last_name']}",
+            "department": emp.get("department", ""),
+            "position": emp.get("position", ""),
+            "site_id": emp.get("site_id"),
+            "leave_type": leave["leave_type"] or "collective",
+            "start_date": leave["start_date"],
+            "end_date": leave["end_date"],
+            "working_days": working_days,
+            "reason": leave["reason"],
+            **native_date_range(leave["start_date"], leave["end_date"]),
+            "status": "approved",  # Auto-approved for collective
+            "is_collective": True,
+            "created_at": now,
+            "created_by": created_by,
+            "admin_comment": "Congé collectif - appliqué à tous les employés",
+            "approved_by": created_by,
+            "approved_at": now
+        })
+        if job_id:
+            chunk[-1]["collective_job_id"] = job_id
+        if len(chunk) >= COLLECTIVE_LEAVE_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    
+    return summary
+
+@background_jobs.handler("collective_leave")
+async def run_collective_leave_job(job: dict) -> dict:
+    params = job["params"]
+    # Resumed after a restart: drop the partial run first so nobody gets the leave twice
+    await db.leaves.delete_many({"collective_job_id": job["id"]})
+    await leaves_changed()
+    return await create_collective_leaves(params["leave"], params["working_days"], job["created_by"], job["id"])
+
+WORKING_DAYS_RECOMPUTE_CHUNK_SIZE = 1000
+
+@background_jobs.handler("working_days_recompute")
+async def recompute_working_days(job: dict) -> dict:
+    """Recompute working_days of pending/approved leaves (optionally one year) against the holiday calendar"""
+    year = job["params"].get("year")
+    query = {"status": {"$in": ["pending", "approved"]}, "start_at": {"$exists": True}}
+    if year:
+        query.update(date_overlap_query(datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year, 12, 31, tzinfo=timezone.utc)))
+    summary = {"scanned": 0, "updated": 0}
+    
+    async def process(chunk):
+        first = min(leave["start_at"] for leave in chunk).date()
+        last = max(leave["end_at"] for leave in chunk).date()
+        holidays = await holiday_calendar.between(first, last) if last >= first else []
+        counts = busday_counts([l["start_date"] for l in chunk], [l["end_date"] for l in chunk], holidays)
+        
+        leave_updates, ledger_entries = [], []
+        for leave, working_days in zip(chunk, counts):
+            if leave.get("working_days") == working_days:
+                continue
+            leave_updates.append(UpdateOne({"id": leave["id"]}, {"$set": {"working_days": working_days}}))
+            # Approved individual leaves already counted in leave_taken: apply the difference
+            if leave["status"] == "approved" and not leave.get("is_collective"):
+                ledger_entries.append(leave_ledger_entry(
+                    leave["employee_id"], leave["leave_type"], "adjust", f"recompute:{job['id']}:{leave['id']}",
+                    taken=working_days - (leave.get("working_days") or 0), year=leave_year(leave),
+                    leave_id=leave["id"], created_by=job["created_by"]
+                ))
+        # Ledger first: its keys make a replay after a crash idempotent, while a leave already
+        # rewritten would no longer show the difference to book
+        await apply_leave_ledger(ledger_entries)
+        if leave_updates:
+            await db.leaves.bulk_write(leave_updates, ordered=False)
+            await leaves_changed()
+        summary["scanned"] += len(chunk)
+        summary["updated"] += len(leave_updates)
+        await background_jobs.progress(job["id"], **summary)
+    
+    chunk = []
+    cursor = db.leaves.find(query, {
+        "_id": 0, "id": 1, "employee_id": 1, "leave_type": 1, "status": 1, "is_collective": 1,
+        "start_date": 1, "end_date": 1, "start_at": 1, "end_at": 1, "working_days": 1
+    }).batch_size(WORKING_DAYS_RECOMPUTE_CHUNK_SIZE)
+    async for leave in cursor:
+        chunk.append(leave)
+        if len(chunk) >= WORKING_DAYS_RECOMPUTE_CHUNK_SIZE:
+            await process(chunk)
+            chunk = []
+    if chunk:
+        await process(chunk)
+    return summary
+
+@leaves_router.post("/recompute-working-days")
+async def start_working_days_recompute(
+    year: Optional[int] = None,
+    current_user: dict = Depends(require_roles(["admin"]))
+):
+    """Recompute working_days of pending/approved leaves in the background (e.g. after adding a holiday)"""
+    job = await background_jobs.enqueue("working_days_recompute", {"year": year}, current_user["id"])
+    return {"message": "Recalcul des jours ouvrables en cours", "job_id": job["id"]}
+
+LEAVE_OVERLAP_MAX_RESULTS = 50
+
+async def find_leave_overlaps(leave: dict) -> List[dict]:
+    """Pending/approved leaves of the same department or site intersecting this leave's dates.
+    
+    One range query; each $or branch is served by its (scope, status, start_at, end_at) index.
+    """
+    dates = native_date_range(leave.get("start_date"), leave.get("end_date"))
+    scopes = [{field: leave[field]} for field in ("department", "site_id") if leave.get(field)]
+    if not dates or not scopes:
+        return []
+    
+    query = {
+        "$or": scopes,
+        "status": {"$in": ["pending", "approved"]},
+        "employee_id": {"$ne": leave["employee_id"]},
+        "is_collective": {"$ne": True},
+        **date_overlap_query(dates["start_at"], dates["end_at"])
+    }
+    overlapping = await db.leaves.find(
+        query,
+        {"_id": 0, "id": 1, "employee_id": 1, "employee_name": 1, "department": 1, "site_id": 1, "status": 1, "start_date": 1, "end_date": 1}
+    ).sort("start_at", 1).to_list(LEAVE_OVERLAP_MAX_RESULTS)
+    
+    return [{
+        "leave_id": o["id"],
+        "employee_id": o["employee_id"],
+        "employee_name": o.get("employee_name", ""),
+        "department": o.get("department", ""),
+        "site_id": o.get("site_id"),
+        "status": o["status"],
+        "dates": f"{o['start_date']} au {o['end_date']}"
+    } for o in overlapping]
+
+async def notify_leave_overlaps(leave: dict):
+    """Alert admins through create_overlap_notification when a leave conflicts with colleagues"""
+    if leave.get("is_collective"):
+        return
+    try:
+        overlaps = await find_leave_overlaps(leave)
+        if overlaps:
+            await create_overlap_notification(
+                leave.get("employee_name", ""), leave.get("department", ""),
+                leave["start_date"], leave["end_date"], overlaps
+            )
+    except Exception as e:
+        logger.error(f"Leave overlap check failed for {leave.get('id')}: {e}")
+
+@leaves_router.get("/{leave_id}/overlaps")
+async def get_leave_overlaps(
+    leave_id: str,
+    current_user: dict = Depends(require_roles(["admin", "secretary"]))
+):
+    """Colleagues (same department or site) whose leaves overlap this one"""
+    leave = await db.leaves.find_one({"id": leave_id}, {"_id": 0})
+    if not leave:
+        raise HTTPException(status_code=404, detail="Demande non trouvée")
+    return {"overlaps": await find_leave_overlaps(leave)}
+
 async def create_overlap_notification(employee_name: str, department: str, start_date: str, end_date: str, overlaps: list):
     """Create notification and send email for leave overlaps"""
     # Create in-app notification for all admins
@@ -1026,8 +3036,8 @@ async def create_overlap_notification(employee_name: str, department: str, start
         await db.notifications.insert_one(notification)
     
     # Send email notification
-    settings = await db.system_settings.find_one({"type": "notifications"}, {"_id": 0})
-    admin_email = settings.get("admin_notification_email", "bahizifranck0@gmail.com") if settings else "bahizifranck0@gmail.com"
+    settings = await config_cache.system_settings()
+    admin_email = settings.get("admin_notification_email", "bahizifranck0@gmail.com")
     
     resend_api_key = os.environ.get('RESEND_API_KEY', '')
     sender_email = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
@@ -1065,38 +3075,142 @@ async def create_overlap_notification(employee_name: str, department: str, start
             logging.error(f"Failed to send overlap notification: {str(e)}")
 
 # ==================== NOTIFICATION HELPER FUNCTIONS ====================
+def notification_doc(user_id: str, title: str, message: str, notification_type: str = "info", link: Optional[str] = None) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "type": notification_type,
+        "title": title,
+        "message": message,
+        "link": link,
+        "read": False,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
 async def create_notification(user_ids: List[str], title: str, message: str, notification_type: str = "info", link: Optional[str] = None):
     """Helper function to create notifications for multiple users"""
-    notifications = []
-    for user_id in user_ids:
-        notification = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "type": notification_type,
-            "title": title,
-            "message": message,
-            "link": link,
-            "read": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        notifications.append(notification)
+    notifications = [notification_doc(user_id, title, message, notification_type, link) for user_id in user_ids]
     
     if notifications:
         await db.notifications.insert_many(notifications)
     return len(notifications)
 
-async def create_admin_notification(title: str, message: str, notification_type: str = "info", link: Optional[str] = None):
-    """Create notification for all admins"""
+async def active_admin_ids() -> List[str]:
     admins = await db.users.find(
         {"role": {"$in": ["admin", "super_admin"]}, "is_active": True}, 
         {"_id": 0, "id": 1}
     ).to_list(100)
-    
-    admin_ids = [admin["id"] for admin in admins]
+    return [admin["id"] for admin in admins]
+
+async def employee_names(employee_ids) -> Dict[str, str]:
+    """Display names of several users in one $in query"""
+    users = await db.users.find(
+        {"id": {"$in": list(set(employee_ids))}}, {"_id": 0, "id": 1, "first_name": 1, "last_name": 1}
+    ).to_list(None)
+    return {u["id"]: f"{u.get('first_name', '')} {u.get('last_name', '')}".strip() for u in users}
+
+async def create_admin_notification(title: str, message: str, notification_type: str = "info", link: Optional[str] = None):
+    """Create notification for all admins"""
+    admin_ids = await active_admin_ids()
     if admin_ids:
         return await create_notification(admin_ids, title, message, notification_type, link)
     return 0
 
+class LoginDigest:
+    """Buffers login events and notifies admins once per flush window.
+    
+    The admin list is resolved once per flush and every admin receives a single
+    aggregated notification (one insert_many), instead of one query and one
+    batch of inserts per login. A full buffer triggers an early flush.
+    """
+    
+    # Lines listed in a digest message before summarising the rest
+    MAX_LISTED_LOGINS = 50
+    
+    def __init__(self, window_seconds: float, max_buffer: int):
+        self.window_seconds = window_seconds
+        self.max_buffer = max(1, max_buffer)
+        self._events: List[dict] = []
+        self._buffer_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.events_flushed = 0
+    
+    def record(self, user: dict, login_time: datetime):
+        user_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or user.get('email', 'Utilisateur')
+        self._events.append({
+            "user_name": user_name,
+            "role": user.get("role", "utilisateur"),
+            "login_time": login_time
+        })
+        if len(self._events) >= self.max_buffer and self._buffer_full is not None:
+            self._buffer_full.set()
+    
+    async def flush(self) -> int:
+        events, self._events = self._events, []
+        if self._buffer_full is not None:
+            self._buffer_full.clear()
+        if not events:
+            return 0
+        
+        lines = [
+            f"{e['user_name']} ({e['role']}) s'est connecté le {e['login_time'].strftime('%d/%m/%Y à %H:%M')}"
+            for e in events[:self.MAX_LISTED_LOGINS]
+        ]
+        if len(events) > self.MAX_LISTED_LOGINS:
+            lines.append(f"... et {len(events) - self.MAX_LISTED_LOGINS} autre(s) connexion(s)")
+        
+        if len(events) == 1:
+            title = f"🔐 Nouvelle connexion: {events[0]['user_name']}"
+        else:
+            title = f"🔐 {len(events)} nouvelles connexions"
+        
+        await create_admin_notification(
+            title=title,
+            message="\n".join(lines),
+            notification_type="info",
+            link=None
+        )
+        self.flushes += 1
+        self.events_flushed += len(events)
+        return len(events)
+    
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._buffer_full.wait(), timeout=self.window_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing login digest: {e}")
+    
+    def start(self):
+        if self._task is None:
+            self._buffer_full = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Error flushing login digest on shutdown: {e}")
+    
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window_seconds,
+            "max_buffer": self.max_buffer,
+            "buffered": len(self._events),
+            "flushes": self.flushes,
+            "events_flushed": self.events_flushed
+        }
+
+login_digest = LoginDigest(LOGIN_DIGEST_WINDOW_SECONDS, LOGIN_DIGEST_MAX_BUFFER)
+
 async def send_upcoming_leaves_notification(admin_user_id: str):
     """Send notification about upcoming leaves when admin logs in"""
     today = datetime.now(timezone.utc).date()
@@ -1117,17 +3231,16 @@ async def send_upcoming_leaves_notification(admin_user_id: str):
     if not upcoming_leaves:
         return
     
-    # Group by date
+    # Group by date (employee names resolved in one query)
+    names = await employee_names(leave["employee_id"] for leave in upcoming_leaves)
     leaves_by_date = {}
     for leave in upcoming_leaves:
         start_date = leave.get("start_date", "")
         if start_date not in leaves_by_date:
             leaves_by_date[start_date] = []
         
-        # Get employee info
-        employee = await db.users.find_one({"id": leave["employee_id"]}, {"_id": 0, "first_name": 1, "last_name": 1})
-        if employee:
-            employee_name = f"{employee.get('first_name', '')} {employee.get('last_name', '')}".strip()
+        employee_name = names.get(leave["employee_id"])
+        if employee_name is not None:
             leaves_by_date[start_date].append({
                 "name": employee_name,
                 "type": leave.get("type", "Congé"),
@@ -1184,14 +3297,7 @@ async def get_leave_balance(current_user: dict = Depends(get_current_user)):
 @leaves_router.get("/rules")
 async def get_leave_rules(current_user: dict = Depends(get_current_user)):
     """Get leave rules - visible to all employees"""
-    rules = await db.leave_rules.find_one({"type": "default"}, {"_id": 0})
-    if not rules:
-        rules = {
-            "annual_days": 26,
-            "sick_days": 2,
-            "exceptional_days": 15,
-            "maternity_days": 90
-        }
+    rules = await config_cache.leave_rules()
     
     leave_types = [
         {
@@ -1233,6 +3339,148 @@ async def get_leave_rules(current_user: dict = Depends(get_current_user)):
     
     return {"rules": rules, "leave_types": leave_types}
 
+def leave_decision_data(status: Optional[str], admin_comment: Optional[str], current_user: dict) -> dict:
+    """$set payload of an HR decision on a leave"""
+    update_data = {}
+    if status:
+        update_data["status"] = status
+        update_data["approved_by"] = current_user["id"]
+        update_data["approved_at"] = datetime.now(timezone.utc).isoformat()
+    
+    if admin_comment is not None:
+        update_data["admin_comment"] = admin_comment
+    return update_data
+
+def leave_transition_ledger_entry(leave: dict, new_status: str, key: str, actor_id: str) -> Optional[dict]:
+    """Ledger movement caused by a status transition (None when the balance is unaffected)"""
+    # Collective leaves (company closures) never consume individual balances
+    if leave.get("is_collective"):
+        return None
+    # Entering approved consumes the days, leaving approved gives them back
+    if new_status == "approved" and leave["status"] != "approved":
+        return leave_ledger_entry(
+            leave["employee_id"], leave["leave_type"], "consume", key,
+            taken=leave["working_days"], year=leave_year(leave), leave_id=leave["id"], created_by=actor_id
+        )
+    if leave["status"] == "approved" and new_status != "approved":
+        return leave_ledger_entry(
+            leave["employee_id"], leave["leave_type"], "reverse", key,
+            taken=-leave["working_days"], year=leave_year(leave), leave_id=leave["id"], created_by=actor_id
+        )
+    return None
+
+def leave_calendar_upsert(leave: dict) -> UpdateOne:
+    """Calendar entry of an approved leave, keyed on leave_id so re-approvals don't duplicate it.
+    
+    Kept for direct readers of db.calendar; the API calendar reads db.leaves, which also has collective leaves.
+    """
+    return UpdateOne(
+        {"leave_id": leave["id"]},
+        {
+            "$set": {
+                "employee_id": leave["employee_id"],
+                "employee_name": leave["employee_name"],
+                "type": "leave",
+                "leave_type": leave["leave_type"],
+                "start_date": leave["start_date"],
+                "end_date": leave["end_date"],
+                **native_date_range(leave["start_date"], leave["end_date"]),
+                "title": f"Congé {leave['leave_type']} - {leave['employee_name']}"
+            },
+            "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat()}
+        },
+        upsert=True
+    )
+
+async def sync_leave_calendar(approved: List[dict], withdrawn_ids: List[str]):
+    """Materialize calendar entries of newly approved leaves and drop those of leaves no longer approved"""
+    if approved:
+        await db.calendar.bulk_write([leave_calendar_upsert(leave) for leave in approved], ordered=False)
+    if withdrawn_ids:
+        await db.calendar.delete_many({"leave_id": {"$in": withdrawn_ids}})
+
+LEAVE_BULK_DECISION_MAX = 1000
+
+@leaves_router.post("/bulk-decision")
+async def bulk_leave_decision(
+    decision: LeaveBulkDecision,
+    current_user: dict = Depends(require_roles(["admin", "secretary"]))
+):
+    """Approve/reject many leaves at once: one read, then bulk writes on leaves, users (ledger) and calendar"""
+    leave_ids = list(dict.fromkeys(decision.leave_ids))
+    if not leave_ids:
+        raise HTTPException(status_code=400, detail="Aucune demande sélectionnée")
+    if len(leave_ids) > LEAVE_BULK_DECISION_MAX:
+        raise HTTPException(status_code=400, detail=f"Maximum {LEAVE_BULK_DECISION_MAX} demandes par lot")
+    
+    leaves = {l["id"]: l for l in await db.leaves.find({"id": {"$in": leave_ids}}, {"_id": 0}).to_list(len(leave_ids))}
+    update_data = leave_decision_data(decision.status, decision.admin_comment, current_user)
+    batch_id = str(uuid.uuid4())
+    
+    results = {}
+    operations = []
+    for leave_id in leave_ids:
+        leave = leaves.get(leave_id)
+        if not leave:
+            results[leave_id] = {"id": leave_id, "result": "error", "detail": "Demande non trouvée"}
+            continue
+        if leave["status"] == decision.status:
+            # Conditional too: must not undo a transition made since the read
+            operations.append(UpdateOne({"id": leave_id, "status": leave["status"]}, {"$set": update_data}))
+            results[leave_id] = {"id": leave_id, "result": "unchanged", "status": leave["status"]}
+            continue
+        # Same conditional transition as update_leave_status, tagged so we can tell which ones matched
+        operations.append(UpdateOne(
+            {"id": leave_id, "status": leave["status"], "ledger_seq": leave.get("ledger_seq")},
+            {"$set": {**update_data, "decision_batch": batch_id}, "$inc": {"ledger_seq": 1}}
+        ))
+        results[leave_id] = None
+    
+    if operations:
+        await db.leaves.bulk_write(operations, ordered=False)
+        await leaves_changed(*[l for l in leaves.values() if "approved" in (l["status"], decision.status)])
+    
+    pending_ids = [leave_id for leave_id, result in results.items() if result is None]
+    applied = set()
+    if pending_ids:
+        applied = {l["id"] for l in await db.leaves.find(
+            {"id": {"$in": pending_ids}, "decision_batch": batch_id}, {"_id": 0, "id": 1}
+        ).to_list(len(pending_ids))}
+    
+    ledger_entries, newly_approved, withdrawn_ids = [], [], []
+    for leave_id in pending_ids:
+        leave = leaves[leave_id]
+        if leave_id not in applied:
+            results[leave_id] = {"id": leave_id, "result": "error", "detail": "La demande a été modifiée entre-temps"}
+            continue
+        ledger_entry = leave_transition_ledger_entry(
+            leave, decision.status, f"leave:{leave_id}:{(leave.get('ledger_seq') or 0) + 1}", current_user["id"]
+        )
+        if ledger_entry:
+            ledger_entries.append(ledger_entry)
+        if decision.status == "approved":
+            newly_approved.append(leave)
+        elif leave["status"] == "approved":
+            withdrawn_ids.append(leave_id)
+        results[leave_id] = {"id": leave_id, "result": "updated", "previous_status": leave["status"], "status": decision.status}
+    
+    await apply_leave_ledger(ledger_entries)
+    await sync_leave_calendar(newly_approved, withdrawn_ids)
+    if newly_approved:
+        await task_runner.put(notify_bulk_leave_overlaps, newly_approved)
+    
+    items = [results[leave_id] for leave_id in leave_ids]
+    return {
+        "updated": sum(1 for r in items if r["result"] == "updated"),
+        "unchanged": sum(1 for r in items if r["result"] == "unchanged"),
+        "failed": sum(1 for r in items if r["result"] == "error"),
+        "results": items
+    }
+
+async def notify_bulk_leave_overlaps(leaves: List[dict]):
+    for leave in leaves:
+        await notify_leave_overlaps(leave)
+
 @leaves_router.put("/{leave_id}")
 async def update_leave_status(
     leave_id: str,
@@ -1244,47 +3492,36 @@ async def update_leave_status(
     if not leave:
         raise HTTPException(status_code=404, detail="Demande non trouvée")
     
-    # Prepare update data
-    update_data = {}
-    if update.status:
-        update_data["status"] = update.status
-        update_data["approved_by"] = current_user["id"]
-        update_data["approved_at"] = datetime.now(timezone.utc).isoformat()
-    
-    if update.admin_comment is not None:
-        update_data["admin_comment"] = update.admin_comment
+    update_data = leave_decision_data(update.status, update.admin_comment, current_user)
     
     # Update leave - NO BALANCE CHECKS, NO VALIDATIONS
-    await db.leaves.update_one({"id": leave_id}, {"$set": update_data})
-    
-    # Update leave balance if approved (optional tracking, not blocking)
-    if update.status == "approved" and leave["status"] != "approved":
-        await db.users.update_one(
-            {"id": leave["employee_id"]},
-            {"$inc": {f"leave_taken.{leave['leave_type']}": leave["working_days"]}}
+    if update.status and update.status != leave["status"]:
+        # Conditional transition: only one concurrent request moves the status (and the balance)
+        transitioned = await db.leaves.find_one_and_update(
+            {"id": leave_id, "status": leave["status"]},
+            {"$set": update_data, "$inc": {"ledger_seq": 1}},
+            return_document=ReturnDocument.AFTER
         )
-    # Restore balance if rejected after approval (optional tracking)
-    elif update.status == "rejected" and leave["status"] == "approved":
-        await db.users.update_one(
-            {"id": leave["employee_id"]},
-            {"$inc": {f"leave_taken.{leave['leave_type']}": -leave["working_days"]}}
+        if not transitioned:
+            raise HTTPException(status_code=409, detail="La demande a été modifiée entre-temps, veuillez réessayer")
+        ledger_entry = leave_transition_ledger_entry(
+            leave, update.status, f"leave:{leave_id}:{transitioned['ledger_seq']}", current_user["id"]
         )
-    
-    # Add to calendar if approved (for visualization only)
+        await apply_leave_ledger([ledger_entry] if ledger_entry else [])
+        if update.status == "approved":
+            await task_runner.put(notify_leave_overlaps, leave)
+    elif update_data:
+        # Same status (or comment only): conditional so a transition made since the read is not undone
+        result = await db.leaves.update_one({"id": leave_id, "status": leave["status"]}, {"$set": update_data})
+        if not result.matched_count:
+            raise HTTPException(status_code=409, detail="La demande a été modifiée entre-temps, veuillez réessayer")
+    await leaves_changed(*([leave] if "approved" in (leave["status"], update.status) else []))
+    
+    # Keep the calendar entry in step with the approval (for visualization only)
     if update.status == "approved":
-        calendar_entry = {
-            "id": str(uuid.uuid4()),
-            "employee_id": leave["employee_id"],
-            "employee_name": leave["employee_name"],
-            "type": "leave",
-            "leave_type": leave["leave_type"],
-            "leave_id": leave_id,
-            "start_date": leave["start_date"],
-            "end_date": leave["end_date"],
-            "title": f"Congé {leave['leave_type']} - {leave['employee_name']}",
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.calendar.insert_one(calendar_entry)
+        await sync_leave_calendar([leave], [])
+    elif update.status and leave["status"] == "approved":
+        await sync_leave_calendar([], [leave_id])
     
     updated = await db.leaves.find_one({"id": leave_id}, {"_id": 0})
     return updated
@@ -1430,15 +3667,18 @@ async def delete_leave(
     if not is_admin and leave["status"] != "pending":
         raise HTTPException(status_code=403, detail="Vous ne pouvez supprimer que les demandes en attente")
     
-    # If was approved, restore the leave balance
-    if leave["status"] == "approved":
-        await db.users.update_one(
-            {"id": leave["employee_id"]},
-            {"$inc": {f"leave_taken.{leave['leave_type']}": -leave.get("working_days", 0)}}
-        )
+    # Delete from leaves collection (only if nobody changed its status meanwhile)
+    deleted = await db.leaves.find_one_and_delete({"id": leave_id, "status": leave["status"]}, projection={"_id": 1})
+    if not deleted:
+        raise HTTPException(status_code=409, detail="La demande a été modifiée entre-temps, veuillez réessayer")
+    await leaves_changed(*([leave] if leave["status"] == "approved" else []))
     
-    # Delete from leaves collection
-    await db.leaves.delete_one({"id": leave_id})
+    # If was approved, restore the leave balance
+    if leave["status"] == "approved" and not leave.get("is_collective"):
+        await apply_leave_ledger([leave_ledger_entry(
+            leave["employee_id"], leave["leave_type"], "reverse", f"leave:{leave_id}:deleted",
+            taken=-leave.get("working_days", 0), year=leave_year(leave), leave_id=leave_id, created_by=current_user["id"]
+        )])
     
     # Also delete from calendar if exists
     await db.calendar.delete_many({"leave_id": leave_id})
@@ -1446,6 +3686,77 @@ async def delete_leave(
     return {"message": "Congé supprimé", "id": leave_id}
 
 # ==================== CALENDAR ROUTES ====================
+CALENDAR_BUCKETS = {"leave": "leaves", "public_holiday": "holidays", "attendance": "attendance"}
+
+async def calendar_range_items(start_date: str, end_date: str, employee_id: Optional[str] = None, include_attendance: bool = False) -> List[dict]:
+    """Approved leaves, public holidays and optionally attendance intersecting [start_date, end_date].
+    
+    One aggregation: a leaves range scan, with holidays from db.calendar and attendance (date, employee_id)
+    merged in via $unionWith. Overlap queries get both a start_at-first and an end_at-first index so
+    the planner can bound recent ranges on end_at instead of scanning every older leave.
+    """
+    range_start, range_end = native_date_range(start_date, end_date).values()
+    leave_match = {"status": "approved", **date_overlap_query(range_start, range_end)}
+    if employee_id:
+        leave_match["employee_id"] = employee_id
+    pipeline = [
+        {"$match": leave_match},
+        {"$project": {
+            "_id": 0, "id": 1, "type": {"$literal": "leave"}, "leave_id": "$id", "employee_id": 1,
+            "employee_name": 1, "department": 1, "leave_type": 1, "start_date": 1, "end_date": 1,
+            "title": {"$concat": ["Congé ", {"$ifNull": ["$leave_type", ""]}, " - ", {"$ifNull": ["$employee_name", ""]}]}
+        }},
+        {"$unionWith": {"coll": "calendar", "pipeline": [
+            {"$match": {"type": "public_holiday", **date_overlap_query(range_start, range_end)}},
+            {"$project": {"_id": 0, "id": 1, "type": 1, "start_date": 1, "end_date": 1, "title": 1}}
+        ]}}
+    ]
+    if include_attendance:
+        attendance_match = {"date": {"$gte": start_date, "$lte": end_date}}
+        if employee_id:
+            attendance_match["employee_id"] = employee_id
+        pipeline.append({"$unionWith": {"coll": "attendance", "pipeline": [
+            {"$match": attendance_match},
+            {"$project": {
+                "_id": 0, "id": 1, "type": {"$literal": "attendance"}, "employee_id": 1, "employee_name": 1,
+                "start_date": "$date", "end_date": "$date", "check_in": 1, "check_out": 1
+            }}
+        ]}})
+    pipeline.append({"$sort": {"start_date": 1, "type": 1}})
+    return await db.leaves.aggregate(pipeline).to_list(None)
+
+def calendar_day_buckets(items: List[dict], dates: List[str]) -> List[dict]:
+    """Per-day lists of item indexes (leaves, holidays, attendance), clipped to the requested dates"""
+    days = {day: {"date": day, "leaves": [], "holidays": [], "attendance": []} for day in dates}
+    for i, item in enumerate(items):
+        bucket = CALENDAR_BUCKETS.get(item.get("type"))
+        if not bucket:
+            continue
+        for day in absence_days(item, dates[0], dates[-1]):
+            days[day][bucket].append(i)
+    return list(days.values())
+
+@calendar_router.get("/range")
+async def get_calendar_range(
+    start_date: str,
+    end_date: str,
+    include_attendance: bool = False,
+    employee_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Leaves, public holidays and (optionally) attendance over any date range, bucketed per day"""
+    dates = requested_days(start_date, end_date)
+    # Employees see only their calendar
+    if current_user["role"] == "employee":
+        employee_id = current_user["id"]
+    items = await calendar_range_items(start_date, end_date, employee_id, include_attendance)
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "items": items,
+        "days": calendar_day_buckets(items, dates)
+    }
+
 @calendar_router.get("")
 async def get_calendar(
     month: Optional[int] = None,
@@ -1456,48 +3767,219 @@ async def get_calendar(
     target_month = month or now.month
     target_year = year or now.year
     
-    query = {}
-    
     # Employees see only their calendar
-    if current_user["role"] == "employee":
-        query["$or"] = [
-            {"employee_id": current_user["id"]},
-            {"type": "public_holiday"}
-        ]
+    employee_id = current_user["id"] if current_user["role"] == "employee" else None
     
-    entries = await db.calendar.find(query, {"_id": 0}).to_list(500)
-    
-    # Filter by month
-    filtered = []
-    for entry in entries:
-        try:
-            start = datetime.strptime(entry["start_date"], "%Y-%m-%d")
-            if start.month == target_month and start.year == target_year:
-                filtered.append(entry)
-        except:
-            pass
+    month_start, month_end = month_range(target_year, target_month)
+    entries = await calendar_range_items(month_start.strftime("%Y-%m-%d"), month_end.strftime("%Y-%m-%d"), employee_id)
     
-    return {"entries": filtered, "month": target_month, "year": target_year}
+    return {"entries": entries, "month": target_month, "year": target_year}
 
 @calendar_router.post("/holiday")
 async def add_public_holiday(
     date: str,
     name: str,
+    recompute: bool = False,
     current_user: dict = Depends(require_roles(["admin"]))
 ):
+    dates = native_date_range(date, date)
+    if not dates:
+        raise HTTPException(status_code=400, detail="Format de date invalide (YYYY-MM-DD)")
     holiday = {
         "id": str(uuid.uuid4()),
         "type": "public_holiday",
         "start_date": date,
         "end_date": date,
+        **native_date_range(date, date),
         "title": name,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "created_by": current_user["id"]
     }
     await db.calendar.insert_one(holiday)
     holiday.pop("_id", None)
+    holiday.pop("start_at", None)
+    holiday.pop("end_at", None)
+    holiday_calendar.invalidate(dates["start_at"].year)
+    await calendar_state.changed()
+    
+    if recompute:
+        job = await background_jobs.enqueue("working_days_recompute", {"year": dates["start_at"].year}, current_user["id"])
+        holiday["recompute_job_id"] = job["id"]
     return holiday
 
+# ==================== CALENDAR FEEDS (ICS) ====================
+ICS_FEEDS = ("user", "department", "company")
+ICS_FEED_PAST_DAYS = int(os.environ.get('ICS_FEED_PAST_DAYS', '365'))
+ICS_FEED_BATCH_SIZE = 500
+
+class CalendarState:
+    """Version and last-modified date of what the ICS feeds show (db.config_state, id "calendar").
+    
+    Bumped inline after every leave and holiday write (never dropped, unlike a queued task); the feeds
+    derive ETag/Last-Modified from it.
+    """
+    async def changed(self) -> None:
+        await db.config_state.update_one(
+            {"id": "calendar"},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).replace(microsecond=0)}},
+            upsert=True
+        )
+    
+    async def current(self) -> tuple:
+        state = await db.config_state.find_one({"id": "calendar"}, {"_id": 0}) or {}
+        updated_at = state.get("updated_at")
+        if updated_at is not None and updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return state.get("version", 0), updated_at
+
+calendar_state = CalendarState()
+
+def create_ics_feed_token(user: dict, feed: str) -> str:
+    """Long-lived token for a calendar client, signed with the feed key; rotating ics_feed_version revokes it"""
+    now = datetime.now(timezone.utc)
+    return jwt.encode(
+        {
+            "sub": user["id"], "aud": ICS_FEED_AUDIENCE, "typ": "ics", "scope": "ics", "feed": feed,
+            "v": user.get("ics_feed_version", 0), "iat": now, "exp": now + timedelta(days=ICS_FEED_TOKEN_DAYS)
+        },
+        ICS_FEED_SECRET_KEY, algorithm=JWT_ALGORITHM
+    )
+
+async def ics_feed_user(token: str, feed: str) -> dict:
+    try:
+        payload = jwt.decode(token, ICS_FEED_SECRET_KEY, algorithms=[JWT_ALGORITHM], audience=ICS_FEED_AUDIENCE)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Token invalide")
+    if payload.get("typ") != "ics" or payload.get("scope") != "ics" or payload.get("feed") != feed:
+        raise HTTPException(status_code=401, detail="Token invalide")
+    user = principal_cache.get(payload["sub"])
+    if user is None:
+        generation = principal_cache.generation
+        user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
+        if user is None:
+            raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
+        principal_cache.set(user["id"], user, generation)
+    if not user.get("is_active", True) or user.get("ics_feed_version", 0) != payload.get("v"):
+        raise HTTPException(status_code=401, detail="Lien de calendrier révoqué")
+    return user
+
+def ics_escape(text) -> str:
+    return str(text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def ics_line(line: str) -> str:
+    """One content line, folded at 75 octets as RFC 5545 requires"""
+    chunks, current, size = [], "", 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > 75:
+            chunks.append(current)
+            current, size = " ", 1
+        current += char
+        size += width
+    chunks.append(current)
+    return "\r\n".join(chunks) + "\r\n"
+
+def ics_event(uid: str, start_date: str, end_date: Optional[str], summary: str, dtstamp: str, description: Optional[str] = None) -> str:
+    """All-day VEVENT (DTEND is exclusive, hence the extra day)"""
+    try:
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date or start_date) + timedelta(days=1)
+    except (TypeError, ValueError):
+        return ""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}",
+        f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}",
+        f"SUMMARY:{ics_escape(summary)}",
+        "TRANSP:TRANSPARENT"
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{ics_escape(description)}")
+    lines.append("END:VEVENT")
+    return "".join(ics_line(line) for line in lines)
+
+async def ics_feed_stream(name: str, leave_query: dict, with_names: bool):
+    """VCALENDAR generated while the leaves and holidays cursors are read"""
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "".join(ics_line(line) for line in [
+        "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//PREMIDIS SARL//HR Platform//FR", "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH", f"X-WR-CALNAME:{ics_escape(name)}"
+    ])
+    projection = {"_id": 0, "id": 1, "employee_name": 1, "leave_type": 1, "start_date": 1, "end_date": 1, "reason": 1}
+    async for leave in db.leaves.find(leave_query, projection).batch_size(ICS_FEED_BATCH_SIZE):
+        summary = f"{leave.get('employee_name', '')} - Congé {leave.get('leave_type', '')}" if with_names else f"Congé {leave.get('leave_type', '')}"
+        yield ics_event(f"leave-{leave['id']}@premidis", leave.get("start_date"), leave.get("end_date"), summary, dtstamp,
+                        None if with_names else leave.get("reason"))
+    holiday_query = {"type": "public_holiday", "end_at": leave_query["end_at"]}
+    async for holiday in db.calendar.find(holiday_query, {"_id": 0, "id": 1, "title": 1, "start_date": 1, "end_date": 1}):
+        yield ics_event(f"holiday-{holiday['id']}@premidis", holiday.get("start_date"), holiday.get("end_date"),
+                        f"Jour férié - {holiday.get('title', '')}", dtstamp)
+    yield ics_line("END:VCALENDAR")
+
+@calendar_router.get("/feeds")
+async def get_calendar_feeds(request: Request, current_user: dict = Depends(get_current_user)):
+    """Subscription URLs (with their signed token) for calendar clients"""
+    # The feed version lives only in db.users (stateless principals carry no ics_feed_version)
+    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0, "id": 1, "ics_feed_version": 1})
+    if user is None:
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    base_url = str(request.base_url).rstrip("/")
+    return {
+        "feeds": [
+            {"feed": feed, "url": f"{base_url}/api/calendar/feeds/{feed}.ics?token={create_ics_feed_token(user, feed)}"}
+            for feed in ICS_FEEDS
+        ]
+    }
+
+@calendar_router.post("/feeds/rotate")
+async def rotate_calendar_feeds(current_user: dict = Depends(get_current_user)):
+    """Invalidate every feed URL issued so far for the current user"""
+    await db.users.update_one({"id": current_user["id"]}, {"$inc": {"ics_feed_version": 1}})
+    invalidate_user(current_user["id"])
+    return {"message": "Liens de calendrier régénérés"}
+
+@calendar_router.get("/feeds/{feed}.ics")
+async def get_calendar_feed(feed: str, token: str, request: Request):
+    """ICS feed of approved leaves and public holidays (user, department or company), cacheable with ETag"""
+    if feed not in ICS_FEEDS:
+        raise HTTPException(status_code=404, detail="Flux non trouvé")
+    user = await ics_feed_user(token, feed)
+    
+    version, updated_at = await calendar_state.current()
+    scope_key = {"user": user["id"], "department": user.get("department") or "", "company": ""}[feed]
+    etag = f'"ics-{feed}-{hashlib.sha1(scope_key.encode()).hexdigest()[:12]}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if updated_at:
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+    elif updated_at and request.headers.get("if-modified-since"):
+        try:
+            if updated_at <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    
+    leave_query = {"status": "approved", "end_at": {"$gte": datetime.now(timezone.utc) - timedelta(days=ICS_FEED_PAST_DAYS)}}
+    if feed == "user":
+        leave_query["employee_id"] = user["id"]
+        name = "Mes congés - PREMIDIS"
+    elif feed == "department":
+        leave_query["department"] = user.get("department")
+        name = f"Congés {user.get('department') or ''} - PREMIDIS"
+    else:
+        name = "Congés PREMIDIS"
+    return StreamingResponse(
+        ics_feed_stream(name, leave_query, with_names=feed != "user"),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers
+    )
+
 # ==================== HR ACTIONS ROUTES ====================
 @hr_router.post("/salary-advance")
 async def create_salary_advance(
@@ -1656,22 +4138,133 @@ async def create_attendance_manual(
     attendance_doc.pop("_id", None)
     return attendance_doc
 
+# ==================== CONFIGURATION CACHE ====================
+DEFAULT_LEAVE_TYPES = [
+    {"id": "annual", "name": "Congé annuel", "code": "annual", "duration_value": 30, "duration_unit": "days", "min_days": 1, "max_days": 30, "default_balance": 30, "requires_approval": True, "is_active": True, "color": "#4F46E5"},
+    {"id": "sick", "name": "Congé maladie", "code": "sick", "duration_value": 2, "duration_unit": "days", "min_days": 2, "max_days": 30, "default_balance": 2, "requires_approval": True, "is_active": True, "color": "#EF4444"},
+    {"id": "maternity", "name": "Congé maternité", "code": "maternity", "duration_value": 3, "duration_unit": "months", "min_days": 90, "max_days": 120, "default_balance": 90, "requires_approval": True, "is_active": True, "color": "#EC4899"},
+    {"id": "paternity", "name": "Congé paternité", "code": "paternity", "duration_value": 10, "duration_unit": "days", "min_days": 10, "max_days": 15, "default_balance": 10, "requires_approval": True, "is_active": True, "color": "#3B82F6"},
+    {"id": "exceptional", "name": "Congé exceptionnel", "code": "exceptional", "duration_value": 15, "duration_unit": "days", "min_days": 1, "max_days": 15, "default_balance": 15, "requires_approval": True, "is_active": True, "color": "#F59E0B"},
+    {"id": "collective", "name": "Congé collectif (tous)", "code": "collective", "duration_value": 1, "duration_unit": "days", "min_days": 1, "max_days": 30, "default_balance": 0, "requires_approval": False, "is_active": True, "color": "#10B981"}
+]
+
+LEAVE_CATEGORIES = [
+    {"id": "cadre", "name": "Cadre", "leave_multiplier": 1.2},
+    {"id": "agent", "name": "Agent", "leave_multiplier": 1.0},
+    {"id": "stagiaire", "name": "Stagiaire", "leave_multiplier": 0.5}
+]
+
+DEFAULT_SYSTEM_SETTINGS = {"type": "notifications", "admin_notification_email": "bahizifranck0@gmail.com"}
+
+CONFIG_CACHE_TTL_SECONDS = int(os.environ.get('CONFIG_CACHE_TTL_SECONDS', '300'))
+
+class ConfigCache:
+    """Leave types, leave rules, categories and system settings held in memory (treat as read-only).
+    
+    Loaded at startup and reloaded by the config write endpoints, which also bump a version shared in
+    db.config_state: other workers catch up within the TTL, clients revalidate with If-None-Match.
+    """
+    def __init__(self, ttl_seconds: int = CONFIG_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._data: Optional[dict] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.loads = 0
+    
+    async def load(self) -> dict:
+        state = await db.config_state.find_one({"id": "config"}, {"_id": 0})
+        leave_types = await db.leave_types.find({"is_active": True}, {"_id": 0}).to_list(None)
+        if not leave_types and not await db.leave_types.find_one({}, {"_id": 1}):
+            # Fresh database: seed the default types in one round trip
+            await db.leave_types.insert_many([dict(lt) for lt in DEFAULT_LEAVE_TYPES])
+            leave_types = [dict(lt) for lt in DEFAULT_LEAVE_TYPES]
+        rules = await db.leave_rules.find_one({"type": "default"}, {"_id": 0})
+        settings = await db.system_settings.find_one({"type": "notifications"}, {"_id": 0})
+        self._data = {
+            "leave_types": leave_types,
+            "leave_rules": rules or {**LeaveRuleConfig().model_dump(), "type": "default"},
+            "categories": LEAVE_CATEGORIES,
+            "system_settings": settings or dict(DEFAULT_SYSTEM_SETTINGS)
+        }
+        self.version = state["version"] if state else 0
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        return self._data
+    
+    def _fresh(self) -> bool:
+        return self._data is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+    
+    async def get(self, key: str):
+        if self._fresh():
+            self.hits += 1
+            return self._data[key]
+        async with self._lock:
+            if not self._fresh():
+                await self.load()
+            return self._data[key]
+    
+    async def invalidate(self) -> None:
+        """Call after writing leave_types, leave_rules or system_settings"""
+        await db.config_state.update_one({"id": "config"}, {"$inc": {"version": 1}}, upsert=True)
+        async with self._lock:
+            await self.load()
+    
+    async def leave_types(self) -> List[dict]:
+        return await self.get("leave_types")
+    
+    async def leave_type(self, code: str) -> Optional[dict]:
+        return next((lt for lt in await self.leave_types() if lt.get("code") == code), None)
+    
+    async def leave_rules(self) -> dict:
+        return await self.get("leave_rules")
+    
+    async def categories(self) -> List[dict]:
+        return await self.get("categories")
+    
+    async def system_settings(self) -> dict:
+        return await self.get("system_settings")
+    
+    def etag(self) -> str:
+        return f'W/"config-{self.version}"'
+    
+    def stats(self) -> dict:
+        return {"version": self.version, "hits": self.hits, "loads": self.loads, "ttl_seconds": self.ttl_seconds}
+
+config_cache = ConfigCache()
+
+def config_not_modified(request: Request, response: Response) -> bool:
+    """Tag a config response with the current version; True when the client already has it"""
+    response.headers["ETag"] = config_cache.etag()
+    response.headers["Cache-Control"] = "private, no-cache"
+    return request.headers.get("if-none-match") == config_cache.etag()
+
+def config_not_modified_response() -> Response:
+    return Response(status_code=304, headers={"ETag": config_cache.etag(), "Cache-Control": "private, no-cache"})
+
 # ==================== CONFIG ROUTES (Admin Only) ====================
 
+@config_router.get("/version")
+async def get_config_version(current_user: dict = Depends(get_current_user)):
+    """Current configuration version (changes whenever leave types, rules or settings are written)"""
+    await config_cache.leave_types()
+    return {"version": config_cache.version, "etag": config_cache.etag()}
+
 # System settings endpoints
 class SystemSettings(BaseModel):
     admin_notification_email: str = "bahizifranck0@gmail.com"
 
 @config_router.get("/system-settings")
-async def get_system_settings(current_user: dict = Depends(require_roles(["admin", "super_admin"]))):
+async def get_system_settings(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(require_roles(["admin", "super_admin"]))
+):
     """Get system settings"""
-    settings = await db.system_settings.find_one({"type": "notifications"}, {"_id": 0})
-    if not settings:
-        settings = {
-            "type": "notifications",
-            "admin_notification_email": "bahizifranck0@gmail.com"
-        }
-        await db.system_settings.insert_one(settings)
+    settings = await config_cache.system_settings()
+    if config_not_modified(request, response):
+        return config_not_modified_response()
     return settings
 
 @config_router.put("/system-settings")
@@ -1692,6 +4285,7 @@ async def update_system_settings(
         {"$set": settings_doc},
         upsert=True
     )
+    await config_cache.invalidate()
     return settings_doc
 
 # Leave types configuration
@@ -1709,25 +4303,11 @@ class LeaveTypeConfig(BaseModel):
     color: str = "#4F46E5"
 
 @config_router.get("/leave-types")
-async def get_leave_types(current_user: dict = Depends(get_current_user)):
-    """Get all configured leave types"""
-    leave_types = await db.leave_types.find({"is_active": True}, {"_id": 0}).to_list(50)
-    
-    # If no custom types exist, return defaults with duration configuration
-    if not leave_types:
-        default_types = [
-            {"id": "annual", "name": "Congé annuel", "code": "annual", "duration_value": 30, "duration_unit": "days", "min_days": 1, "max_days": 30, "default_balance": 30, "requires_approval": True, "is_active": True, "color": "#4F46E5"},
-            {"id": "sick", "name": "Congé maladie", "code": "sick", "duration_value": 2, "duration_unit": "days", "min_days": 2, "max_days": 30, "default_balance": 2, "requires_approval": True, "is_active": True, "color": "#EF4444"},
-            {"id": "maternity", "name": "Congé maternité", "code": "maternity", "duration_value": 3, "duration_unit": "months", "min_days": 90, "max_days": 120, "default_balance": 90, "requires_approval": True, "is_active": True, "color": "#EC4899"},
-            {"id": "paternity", "name": "Congé paternité", "code": "paternity", "duration_value": 10, "duration_unit": "days", "min_days": 10, "max_days": 15, "default_balance": 10, "requires_approval": True, "is_active": True, "color": "#3B82F6"},
-            {"id": "exceptional", "name": "Congé exceptionnel", "code": "exceptional", "duration_value": 15, "duration_unit": "days", "min_days": 1, "max_days": 15, "default_balance": 15, "requires_approval": True, "is_active": True, "color": "#F59E0B"},
-            {"id": "collective", "name": "Congé collectif (tous)", "code": "collective", "duration_value": 1, "duration_unit": "days", "min_days": 1, "max_days": 30, "default_balance": 0, "requires_approval": False, "is_active": True, "color": "#10B981"}
-        ]
-        # Insert default types
-        for lt in default_types:
-            await db.leave_types.insert_one(lt)
-        leave_types = default_types
-    
+async def get_leave_types(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    """Get all configured leave types (defaults are seeded on a fresh database)"""
+    leave_types = await config_cache.leave_types()
+    if config_not_modified(request, response):
+        return config_not_modified_response()
     return {"leave_types": leave_types}
 
 # Endpoint to calculate end date based on leave type and start date
@@ -1738,7 +4318,7 @@ async def calculate_leave_end_date(
     current_user: dict = Depends(get_current_user)
 ):
     """Calculate end date based on leave type configuration"""
-    leave_type = await db.leave_types.find_one({"code": leave_type_code, "is_active": True}, {"_id": 0})
+    leave_type = await config_cache.leave_type(leave_type_code)
     
     if not leave_type:
         raise HTTPException(status_code=404, detail="Type de congé non trouvé")
@@ -1795,6 +4375,7 @@ async def create_leave_type(
     
     await db.leave_types.insert_one(leave_type_doc)
     leave_type_doc.pop("_id", None)
+    await config_cache.invalidate()
     return leave_type_doc
 
 @config_router.put("/leave-types/{leave_type_id}")
@@ -1812,6 +4393,7 @@ async def update_leave_type(
         {"id": leave_type_id},
         {"$set": update_data}
     )
+    await config_cache.invalidate()
     return {"message": "Type de congé mis à jour"}
 
 @config_router.delete("/leave-types/{leave_type_id}")
@@ -1824,15 +4406,14 @@ async def delete_leave_type(
         {"id": leave_type_id},
         {"$set": {"is_active": False}}
     )
+    await config_cache.invalidate()
     return {"message": "Type de congé désactivé"}
 
 @config_router.get("/leave-rules")
-async def get_leave_rules(current_user: dict = Depends(require_roles(["admin"]))):
-    rules = await db.leave_rules.find_one({"type": "default"}, {"_id": 0})
-    if not rules:
-        rules = LeaveRuleConfig().model_dump()
-        rules["type"] = "default"
-        await db.leave_rules.insert_one(rules)
+async def get_leave_rules(request: Request, response: Response, current_user: dict = Depends(require_roles(["admin"]))):
+    rules = await config_cache.leave_rules()
+    if config_not_modified(request, response):
+        return config_not_modified_response()
     return rules
 
 @config_router.put("/leave-rules")
@@ -1850,17 +4431,15 @@ async def update_leave_rules(
         {"$set": rules_doc},
         upsert=True
     )
+    await config_cache.invalidate()
     return rules_doc
 
 @config_router.get("/categories")
-async def get_categories(current_user: dict = Depends(get_current_user)):
-    return {
-        "categories": [
-            {"id": "cadre", "name": "Cadre", "leave_multiplier": 1.2},
-            {"id": "agent", "name": "Agent", "leave_multiplier": 1.0},
-            {"id": "stagiaire", "name": "Stagiaire", "leave_multiplier": 0.5}
-        ]
-    }
+async def get_categories(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    categories = await config_cache.categories()
+    if config_not_modified(request, response):
+        return config_not_modified_response()
+    return {"categories": categories}
 
 # ==================== PERMISSIONS SYSTEM ====================
 
@@ -2360,13 +4939,16 @@ async def update_permissions(
 
 # ==================== BEHAVIOR TRACKING ROUTES ====================
 @behavior_router.get("")
-async def list_behaviors(current_user: dict = Depends(get_current_user)):
+async def list_behaviors(
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """List behavior notes - employees see only their own"""
     query = {}
     if current_user["role"] == "employee":
         query["employee_id"] = current_user["id"]
     
-    behaviors = await db.behaviors.find(query, {"_id": 0}).sort("date", -1).to_list(500)
+    behaviors = await db.behaviors.find(query, BEHAVIOR_FIELDS.projection(fields)).sort("date", -1).to_list(500)
     return {"behaviors": behaviors}
 
 @behavior_router.post("", status_code=status.HTTP_201_CREATED)
@@ -2520,7 +5102,7 @@ async def get_employee_salary(
     if current_user["role"] == "employee" and current_user["id"] != employee_id:
         raise HTTPException(status_code=403, detail="Accès refusé - Vous ne pouvez voir que votre propre salaire")
     
-    employee = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0})
+    employee = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
     if not employee:
         raise HTTPException(status_code=404, detail="Employé non trouvé")
     
@@ -2548,6 +5130,7 @@ async def update_employee_salary(
             "salary_updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    invalidate_user(employee_id)
     return {"message": "Salaire mis à jour", "salary": salary, "salary_currency": currency}
 
 # ==================== COMMUNICATION ROUTES ====================
@@ -2784,6 +5367,8 @@ async def upload_avatar(
         {"id": employee_id},
         {"$set": {"avatar_url": avatar_url}}
     )
+    invalidate_user(employee_id)
+    await revocation_list.revoke(employee_id, "claims_changed")
     
     return {
         "success": True,
@@ -2849,9 +5434,10 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     
     if current_user["role"] in ["admin", "secretary"]:
         stats["total_employees"] = await db.users.count_documents({"is_active": True})
-        stats["pending_leaves"] = await db.leaves.count_documents({"status": "pending"})
-        stats["approved_leaves"] = await db.leaves.count_documents({"status": "approved"})
-        stats["rejected_leaves"] = await db.leaves.count_documents({"status": "rejected"})
+        leave_stats = await compute_leave_stats()
+        stats["pending_leaves"] = leave_stats["pending"]
+        stats["approved_leaves"] = leave_stats["approved"]
+        stats["rejected_leaves"] = leave_stats["rejected"]
         
         # Department breakdown
         dept_pipeline = [
@@ -3032,48 +5618,65 @@ async def clear_all_notifications(
     return {"message": f"{result.deleted_count} notification(s) d'erreur supprimée(s)"}
 
 # ==================== LEAVE REMINDER SCHEDULER ====================
+LEAVE_REMINDER_BATCH_SIZE = int(os.environ.get('LEAVE_REMINDER_BATCH_SIZE', '500'))
+LEAVE_REMINDER_CRON = os.environ.get('LEAVE_REMINDER_CRON', '0 8 * * *')
+
+@scheduler.job("leave_reminders", LEAVE_REMINDER_CRON)
 async def send_leave_reminders_background():
-    """Send reminders for leaves starting tomorrow - called by background scheduler"""
+    """Send reminders for leaves starting tomorrow - called by background scheduler.
+    
+    Set-based: leaves are read in batches, each batch resolves its employees with one $in query and
+    writes all its notifications (admins + employees) with one insert_many.
+    """
     tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).date()
     tomorrow_str = tomorrow.isoformat()
     
+    admin_ids = await active_admin_ids()
+    projection = {"_id": 0, "employee_id": 1, "type": 1, "start_date": 1, "end_date": 1}
     # Find leaves starting tomorrow
-    leaves = await db.leaves.find(
-        {
-            "status": "approved",
-            "start_date": tomorrow_str
-        },
-        {"_id": 0}
-    ).to_list(100)
-    
-    for leave in leaves:
-        employee = await db.users.find_one({"id": leave["employee_id"]}, {"_id": 0})
-        if not employee:
-            continue
-        
-        employee_name = f"{employee.get('first_name', '')} {employee.get('last_name', '')}".strip()
-        leave_type = leave.get("type", "Congé")
-        start_date = leave.get("start_date", "")
-        end_date = leave.get("end_date", "")
+    cursor = db.leaves.find({"status": "approved", "start_date": tomorrow_str}, projection).batch_size(LEAVE_REMINDER_BATCH_SIZE)
+    
+    count = 0
+    while True:
+        leaves = await cursor.to_list(LEAVE_REMINDER_BATCH_SIZE)
+        if not leaves:
+            break
+        names = await employee_names(leave["employee_id"] for leave in leaves)
         
-        # Notification pour l'admin
-        await create_admin_notification(
-            title=f"📅 Rappel: Congé de {employee_name} demain",
-            message=f"{employee_name} commence son {leave_type} demain ({start_date} au {end_date})",
-            notification_type="info",
-            link="/time-management"
-        )
+        notifications = []
+        for leave in leaves:
+            employee_name = names.get(leave["employee_id"])
+            if employee_name is None:
+                continue
+            leave_type = leave.get("type", "Congé")
+            start_date = leave.get("start_date", "")
+            end_date = leave.get("end_date", "")
+            
+            # Notification pour les admins
+            notifications.extend(
+                notification_doc(
+                    admin_id,
+                    f"📅 Rappel: Congé de {employee_name} demain",
+                    f"{employee_name} commence son {leave_type} demain ({start_date} au {end_date})",
+                    "info",
+                    "/time-management"
+                )
+                for admin_id in admin_ids
+            )
+            # Notification pour l'employé
+            notifications.append(notification_doc(
+                leave["employee_id"],
+                "📅 Rappel: Votre congé commence demain",
+                f"Votre {leave_type} commence demain ({start_date} au {end_date})",
+                "info",
+                "/time-management"
+            ))
+            count += 1
         
-        # Notification pour l'employé
-        await create_notification(
-            user_ids=[leave["employee_id"]],
-            title=f"📅 Rappel: Votre congé commence demain",
-            message=f"Votre {leave_type} commence demain ({start_date} au {end_date})",
-            notification_type="info",
-            link="/time-management"
-        )
+        if notifications:
+            await db.notifications.insert_many(notifications, ordered=False)
     
-    return len(leaves)
+    return count
 
 @notifications_router.post("/test-leave-reminders")
 async def test_leave_reminders(
@@ -3158,18 +5761,25 @@ async def list_hierarchical_groups(
     # Enrich with manager and member details
     for group in groups:
         if group.get("manager_id"):
-            manager = await db.users.find_one({"id": group["manager_id"]}, {"_id": 0, "password": 0})
+            manager = await db.users.find_one({"id": group["manager_id"]}, {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0})
             group["manager"] = manager
         
         if group.get("member_ids"):
             members = await db.users.find(
                 {"id": {"$in": group["member_ids"]}}, 
-                {"_id": 0, "password": 0}
+                {"_id": 0, "password": 0, "search_tokens": 0, "search_rank": 0}
             ).to_list(100)
             group["members"] = members
     
     return {"groups": groups}
 
+async def group_members_changed(*user_ids: Optional[str]):
+    """Group writes move site_id (a signed principal claim): drop cached principals and stale tokens"""
+    user_ids = {uid for uid in user_ids if uid}
+    invalidate_user(*user_ids)
+    for uid in user_ids:
+        await revocation_list.revoke(uid, "claims_changed")
+
 @sites_router.post("/groups", status_code=status.HTTP_201_CREATED)
 async def create_hierarchical_group(
     group: HierarchicalGroupCreate,
@@ -3202,6 +5812,7 @@ async def create_hierarchical_group(
             {"id": group.manager_id},
             {"$set": {"hierarchical_group_id": group_doc["id"], "site_id": group.site_id, "is_manager": True}}
         )
+    await group_members_changed(*group.member_ids, group.manager_id)
     
     group_doc.pop("_id", None)
     return group_doc
@@ -3245,6 +5856,10 @@ async def update_hierarchical_group(
             {"id": group.manager_id},
             {"$set": {"hierarchical_group_id": group_id, "site_id": group.site_id, "is_manager": True}}
         )
+    await group_members_changed(
+        *existing.get("member_ids", []), existing.get("manager_id"),
+        *group.member_ids, group.manager_id
+    )
     
     return {"message": "Groupe mis à jour"}
 
@@ -3267,6 +5882,7 @@ async def delete_hierarchical_group(
                 {"id": group["manager_id"]},
                 {"$unset": {"hierarchical_group_id": "", "is_manager": ""}}
             )
+        await group_members_changed(*group.get("member_ids", []), group.get("manager_id"))
     
     await db.hierarchical_groups.delete_one({"id": group_id})
     return {"message": "Groupe supprimé"}
@@ -3407,7 +6023,7 @@ async def create_signature_password(
     if len(pwd_data.password) < 6:
         raise HTTPException(status_code=400, detail="Le mot de passe doit contenir au moins 6 caractères")
     
-    hashed_password = get_password_hash(pwd_data.password)
+    hashed_password = await password_hasher.hash(pwd_data.password)
     
     await db.signature_passwords.update_one(
         {"user_id": current_user["id"]},
@@ -3432,7 +6048,7 @@ async def verify_signature_password(
     if not pwd_record:
         raise HTTPException(status_code=404, detail="Mot de passe de signature non configuré")
     
-    if not verify_password(pwd_data.password, pwd_record["hashed_password"]):
+    if not await password_hasher.verify(pwd_data.password, pwd_record["hashed_password"]):
         raise HTTPException(status_code=401, detail="Mot de passe incorrect")
     
     return {"message": "Mot de passe vérifié"}
@@ -3457,7 +6073,7 @@ async def update_signature_password(
         raise HTTPException(status_code=404, detail="Mot de passe de signature non configuré")
     
     # Verify old password
-    if not verify_password(pwd_data.old_password, pwd_record["hashed_password"]):
+    if not await password_hasher.verify(pwd_data.old_password, pwd_record["hashed_password"]):
         raise HTTPException(status_code=401, detail="Ancien mot de passe incorrect")
     
     # Validate new password
@@ -3468,7 +6084,7 @@ async def update_signature_password(
         raise HTTPException(status_code=400, detail="Le mot de passe doit contenir au moins 6 caractères")
     
     # Update password
-    hashed_password = get_password_hash(pwd_data.new_password)
+    hashed_password = await password_hasher.hash(pwd_data.new_password)
     await db.signature_passwords.update_one(
         {"user_id": current_user["id"]},
         {"$set": {
@@ -3498,7 +6114,7 @@ async def reset_signature_password(
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
     # Reset password
-    hashed_password = get_password_hash(pwd_data.new_password)
+    hashed_password = await password_hasher.hash(pwd_data.new_password)
     await db.signature_passwords.update_one(
         {"user_id": pwd_data.user_id},
         {"$set": {
@@ -3715,9 +6331,10 @@ async def create_document(
 async def list_documents(
     employee_id: Optional[str] = None,
     status: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """List documents with permission-based filtering"""
+    """List documents with permission-based filtering (content only with fields=full)"""
     query = {}
     
     # Admin and managers can see all documents or filter by employee
@@ -3738,7 +6355,7 @@ async def list_documents(
     else:
         query["employee_id"] = current_user["id"]
     
-    documents = await db.hr_documents.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    documents = await db.hr_documents.find(query, HR_DOCUMENT_FIELDS.projection(fields)).sort("created_at", -1).to_list(100)
     return {"documents": documents}
 
 @documents_router.get("/{document_id}")
@@ -3813,7 +6430,7 @@ async def approve_document(
     if not pwd_record:
         raise HTTPException(status_code=400, detail="Mot de passe de signature non configuré. Veuillez le créer d'abord.")
     
-    if not verify_password(approval.signature_password, pwd_record["hashed_password"]):
+    if not await password_hasher.verify(approval.signature_password, pwd_record["hashed_password"]):
         raise HTTPException(status_code=401, detail="Mot de passe de signature incorrect")
     
     # Get document
@@ -3872,6 +6489,24 @@ async def get_document_history(
     
     return {"history": history}
 
+# ==================== METRICS ====================
+@metrics_router.get("")
+async def get_runtime_metrics(current_user: dict = Depends(require_roles(["admin", "super_admin"]))):
+    """In-process counters for this worker (caches, pools, queues)"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "auth_revocations": revocation_list.stats(),
+        "login_digest": login_digest.stats(),
+        "background_jobs": background_jobs.stats(),
+        "holiday_calendar": holiday_calendar.stats(),
+        "leave_stats_cache": leave_stats_cache.stats(),
+        "absence_rollup": absence_rollup.stats(),
+        "config_cache": config_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "task_runner": task_runner.stats()
+    }
+
 @api_router.get("/")
 async def root():
     return {"message": "PREMIDIS SARL - HR Platform", "version": "2.0.0"}
@@ -3892,15 +6527,21 @@ api_router.include_router(sites_router)
 api_router.include_router(departments_router)
 api_router.include_router(documents_router)
 api_router.include_router(permissions_router)  # Nouveau système de permissions dynamiques
+api_router.include_router(metrics_router)
+api_router.include_router(jobs_router)
+api_router.include_router(scheduler_router)
 
 # ==================== DOCUMENTS MODULE (WORD-LIKE) ROUTES ====================
 documents_module_router = APIRouter(prefix="/documents", tags=["Documents Module"])
 
 # ========== FORMS (Templates) ==========
 @documents_module_router.get("/forms")
-async def list_forms(current_user: dict = Depends(get_current_user)):
-    """Get all document forms/templates"""
-    forms = await db.document_forms.find({}, {"_id": 0}).to_list(100)
+async def list_forms(
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get all document forms/templates (content only with fields=full)"""
+    forms = await db.document_forms.find({}, FORM_FIELDS.projection(fields)).to_list(100)
     return {"forms": forms}
 
 @documents_module_router.post("/forms", status_code=status.HTTP_201_CREATED)
@@ -3943,16 +6584,17 @@ async def delete_form(
 # ========== DOCUMENTS ==========
 @documents_module_router.get("")
 async def list_all_documents(
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all documents (historique)"""
+    """Get all documents (historique, content only with fields=full)"""
     query = {}
     
     # Non-admin users see only their own documents
     if current_user["role"] not in ["super_admin", "admin"]:
         query["author_id"] = current_user["id"]
     
-    documents = await db.documents.find(query, {"_id": 0}).sort("updated_at", -1).to_list(100)
+    documents = await db.documents.find(query, DOCUMENT_FIELDS.projection(fields)).sort("updated_at", -1).to_list(100)
     return {"documents": documents}
 
 @documents_module_router.post("", status_code=status.HTTP_201_CREATED)
@@ -4684,13 +7326,112 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def run_migration(name: str, migrate) -> None:
+    """Run a one-off startup migration once per database (completion recorded in db.config_state, id "migrations").
+    
+    Workers booting together may both run it before it is recorded, so migrations must be idempotent.
+    """
+    state = await db.config_state.find_one({"id": "migrations"}, {"_id": 0}) or {}
+    if name in state.get("done", {}):
+        return
+    await migrate()
+    await db.config_state.update_one(
+        {"id": "migrations"}, {"$set": {f"done.{name}": datetime.now(timezone.utc).isoformat()}}, upsert=True
+    )
+    logger.info(f"Migration {name} done")
+
+async def backfill_employee_search_tokens():
+    """Compute search_tokens/search_rank for users created before the search keys existed"""
+    updates = []
+    async for user in db.users.find({"search_rank": {"$exists": False}}, {"_id": 0, "id": 1, **{f: 1 for f in EMPLOYEE_SEARCH_FIELDS}}):
+        updates.append(UpdateOne({"id": user["id"]}, {"$set": employee_search_keys(user)}))
+        if len(updates) >= 500:
+            await db.users.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.users.bulk_write(updates, ordered=False)
+
+async def backfill_native_dates():
+    """One-off migration: add start_at/end_at to leaves and calendar entries stored with strings only"""
+    migrated = 0
+    for collection in (db.leaves, db.calendar):
+        updates = []
+        async for doc in collection.find({"start_at": {"$exists": False}}, {"_id": 1, "start_date": 1, "end_date": 1}):
+            dates = native_date_range(doc.get("start_date"), doc.get("end_date"))
+            if not dates:
+                continue
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": dates}))
+            migrated += 1
+            if len(updates) >= 500:
+                await collection.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            await collection.bulk_write(updates, ordered=False)
+    if migrated:
+        # Migrated entries start matching the feeds' end_at filter
+        await calendar_state.changed()
+
+async def dedupe_leave_calendar():
+    """Remove duplicate calendar entries left by repeated approvals, keeping the oldest per leave"""
+    duplicates = await db.calendar.aggregate([
+        {"$match": {"leave_id": {"$type": "string"}}},
+        {"$sort": {"created_at": 1}},
+        {"$group": {"_id": "$leave_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]).to_list(None)
+    extra_ids = [_id for group in duplicates for _id in group["ids"][1:]]
+    for i in range(0, len(extra_ids), 500):
+        await db.calendar.delete_many({"_id": {"$in": extra_ids[i:i + 500]}})
+    if extra_ids:
+        logger.info(f"Removed {len(extra_ids)} duplicate calendar entries")
+
+async def backfill_leave_sites():
+    """Copy each employee's site_id onto leaves created before leaves carried it"""
+    sites = await db.users.aggregate([
+        {"$match": {"site_id": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$site_id", "employee_ids": {"$push": "$id"}}}
+    ]).to_list(None)
+    for site in sites:
+        await db.leaves.update_many(
+            {"employee_id": {"$in": site["employee_ids"]}, "site_id": {"$exists": False}},
+            {"$set": {"site_id": site["_id"]}}
+        )
+
 @app.on_event("startup")
 async def startup_event():
+    task_runner.start()
     await db.users.create_index("email", unique=True)
+    await db.users.create_index("email", name="email_ci", collation=EMAIL_COLLATION)
     await db.users.create_index("id", unique=True)
+    # Keyset pagination of list_employees: (filter, sort field, id)
+    await db.users.create_index([("last_name", 1), ("id", 1)])
+    await db.users.create_index([("first_name", 1), ("id", 1)])
+    await db.users.create_index([("email", 1), ("id", 1)])
+    await db.users.create_index([("created_at", 1), ("id", 1)])
+    await db.users.create_index([("hierarchy_level", 1), ("id", 1)])
+    await db.users.create_index([("department", 1), ("last_name", 1), ("id", 1)])
+    await db.users.create_index([("is_active", 1), ("last_name", 1), ("id", 1)])
+    await db.users.create_index([("site_id", 1), ("last_name", 1), ("id", 1)])
+    await db.users.create_index([("hierarchy_level", 1), ("last_name", 1), ("id", 1)])
+    await db.users.create_index("search_tokens")
+    await run_migration("employee_search_keys", backfill_employee_search_tokens)
     await db.leaves.create_index("employee_id")
     await db.leaves.create_index("status")
+    await db.leaves.create_index("collective_job_id", sparse=True)
     await db.calendar.create_index("start_date")
+    await run_migration("native_dates", backfill_native_dates)
+    await db.leaves.create_index([("status", 1), ("start_at", 1), ("end_at", 1)])
+    await db.leaves.create_index([("status", 1), ("end_at", 1), ("start_at", 1)])
+    await run_migration("leave_sites", backfill_leave_sites)
+    await db.leaves.create_index([("department", 1), ("status", 1), ("start_at", 1), ("end_at", 1)])
+    await db.leaves.create_index([("site_id", 1), ("status", 1), ("start_at", 1), ("end_at", 1)])
+    await db.calendar.create_index([("start_at", 1), ("end_at", 1)])
+    await db.calendar.create_index([("type", 1), ("end_at", 1), ("start_at", 1)])
+    await db.attendance.create_index([("date", 1), ("employee_id", 1)])
+    await dedupe_leave_calendar()
+    await db.calendar.create_index(
+        "leave_id", unique=True, partialFilterExpression={"leave_id": {"$type": "string"}}
+    )
     
     # Initialize default leave rules
     existing_rules = await db.leave_rules.find_one({"type": "default"})
@@ -4698,9 +7439,32 @@ async def startup_event():
         default_rules = LeaveRuleConfig().model_dump()
         default_rules["type"] = "default"
         await db.leave_rules.insert_one(default_rules)
+    await config_cache.load()
+    
+    await db.leave_ledger.create_index("key", unique=True)
+    await db.leave_ledger.create_index([("employee_id", 1), ("year", 1), ("leave_type", 1)])
+    await backfill_leave_ledger()
+    await db.background_jobs.create_index("id", unique=True)
+    await db.background_jobs.create_index("status")
+    await db.absence_daily.create_index([("date", 1), ("department", 1), ("site_id", 1)], unique=True)
+    
+    await revocation_list.start()
+    login_digest.start()
+    await background_jobs.resume()
+    await scheduler.start()
+    # First start with the rollup: build it once from existing approved leaves
+    if not await db.absence_daily.find_one({}) and await db.leaves.find_one({"status": "approved"}) \
+            and not await db.background_jobs.find_one({"type": "absence_rollup_rebuild", "status": {"$in": ["queued", "running"]}}):
+        await background_jobs.enqueue("absence_rollup_rebuild", {}, None)
     
     logger.info("PREMIDIS SARL HR Platform started")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await scheduler.stop()
+    await background_jobs.stop()
+    await task_runner.stop()
+    await login_digest.stop()
+    revocation_list.stop()
+    password_hasher.shutdown()
     client.close()
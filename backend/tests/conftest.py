@@ -0,0 +1,11 @@
+"""
+Shared setup for the unit tests of server.py helpers.
+The Motor client connects lazily, so importing server needs only the connection settings.
+"""
+
+import os
+import sys
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "premidis_test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
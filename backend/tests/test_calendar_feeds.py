@@ -0,0 +1,103 @@
+"""
+Unit tests for the ICS calendar feed helpers
+- ics_line folds content lines at 75 octets (RFC 5545)
+- Feed URL tokens are never accepted as API bearer tokens
+- Feed URLs issued to stateless-claims principals survive a rotation
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+USER = {"id": "user-1", "ics_feed_version": 0}
+
+
+class TestIcsLine:
+    """ics_line folding"""
+
+    def test_short_line_is_not_folded(self):
+        assert server.ics_line("SUMMARY:Congé") == "SUMMARY:Congé\r\n"
+
+    def test_long_line_is_folded_at_75_octets(self):
+        folded = server.ics_line("DESCRIPTION:" + "x" * 200)
+        lines = folded.split("\r\n")[:-1]
+        assert len(lines) == 3
+        assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+        assert all(line.startswith(" ") for line in lines[1:])
+        assert "".join(line[1:] if i else line for i, line in enumerate(lines)) == "DESCRIPTION:" + "x" * 200
+
+    def test_multibyte_characters_are_not_split(self):
+        folded = server.ics_line("SUMMARY:" + "é" * 100)
+        for line in folded.split("\r\n")[:-1]:
+            assert len(line.encode("utf-8")) <= 75
+            line.encode("utf-8").decode("utf-8")
+
+
+class TestFeedToken:
+    """Feed tokens only open their own feed"""
+
+    def test_feed_token_rejected_by_get_current_user(self):
+        token = server.create_ics_feed_token(USER, "company")
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(server.get_current_user(credentials))
+        assert exc.value.status_code == 401
+
+    def test_feed_token_rejected_even_if_signed_with_api_key(self):
+        token = server.jwt.encode(
+            {"sub": USER["id"], "scope": "ics", "feed": "company", "v": 0},
+            server.JWT_SECRET_KEY, algorithm=server.JWT_ALGORITHM
+        )
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(server.get_current_user(credentials))
+        assert exc.value.status_code == 401
+
+    def test_access_token_rejected_by_feed(self):
+        token = server.create_access_token({"sub": USER["id"], "role": "admin"})
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(server.ics_feed_user(token, "company"))
+        assert exc.value.status_code == 401
+
+    def test_feed_token_bound_to_its_feed(self):
+        token = server.create_ics_feed_token(USER, "user")
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(server.ics_feed_user(token, "company"))
+        assert exc.value.status_code == 401
+
+
+class TestFeedTokenStatelessClaims:
+    """Feed URLs carry the stored ics_feed_version, even for principals built from signed claims"""
+
+    def test_urls_issued_after_rotation_are_accepted(self, monkeypatch):
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        from starlette.requests import Request
+
+        db = mongomock_motor.AsyncMongoMockClient().db
+        monkeypatch.setattr(server, "db", db)
+        monkeypatch.setattr(server, "AUTH_STATELESS_CLAIMS", True)
+        user = {"id": "user-1", "email": "a@x.com", "role": "employee", "is_active": True, "ics_feed_version": 0}
+        request = Request({"type": "http", "scheme": "http", "server": ("testserver", 80), "path": "/", "root_path": "", "headers": []})
+
+        async def scenario():
+            await db.users.insert_one(dict(user))
+            token = server.create_access_token({"sub": user["id"], **server.principal_claims(user)})
+            principal = await server.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+            assert "ics_feed_version" not in principal
+
+            old_url = (await server.get_calendar_feeds(request, principal))["feeds"][0]["url"]
+            await server.rotate_calendar_feeds(principal)
+            new_url = (await server.get_calendar_feeds(request, principal))["feeds"][0]["url"]
+            feed = new_url.split("/feeds/")[1].split(".ics")[0]
+
+            assert (await server.ics_feed_user(new_url.split("token=")[1], feed))["id"] == user["id"]
+            with pytest.raises(HTTPException) as exc:
+                await server.ics_feed_user(old_url.split("token=")[1], feed)
+            assert exc.value.status_code == 401
+
+        asyncio.run(scenario())
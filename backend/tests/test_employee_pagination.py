@@ -0,0 +1,76 @@
+"""
+Unit tests for list_employees keyset pagination
+- employee_keyset_filter continues past null/missing sort values in both orders
+- decode_employee_cursor rejects cursors built for another sort
+"""
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+EMPLOYEES = [
+    {"id": "e1", "hierarchy_level": "2"},
+    {"id": "e2", "hierarchy_level": None},
+    {"id": "e3"},
+    {"id": "e4", "hierarchy_level": "1"},
+    {"id": "e5", "hierarchy_level": "2"},
+    {"id": "e6", "hierarchy_level": None},
+]
+
+
+class TestKeysetFilter:
+    """Filter shapes"""
+
+    def test_non_null_ascending(self):
+        f = server.employee_keyset_filter("last_name", "asc", {"v": "Dupont", "id": "e1"})
+        assert f == {"$or": [{"last_name": {"$gt": "Dupont"}}, {"last_name": "Dupont", "id": {"$gt": "e1"}}]}
+
+    def test_non_null_descending_keeps_null_tail(self):
+        f = server.employee_keyset_filter("last_name", "desc", {"v": "Dupont", "id": "e1"})
+        assert {"last_name": None} in f["$or"]
+
+    def test_null_cursor_ascending_continues_to_values(self):
+        f = server.employee_keyset_filter("hierarchy_level", "asc", {"v": None, "id": "e2"})
+        assert f == {"$or": [{"hierarchy_level": None, "id": {"$gt": "e2"}}, {"hierarchy_level": {"$ne": None}}]}
+
+    def test_null_cursor_descending_stays_in_null_tail(self):
+        f = server.employee_keyset_filter("hierarchy_level", "desc", {"v": None, "id": "e6"})
+        assert f == {"hierarchy_level": None, "id": {"$lt": "e6"}}
+
+
+class TestKeysetPagination:
+    """Walk every page against an in-memory collection"""
+
+    @pytest.mark.parametrize("order", ["asc", "desc"])
+    def test_pages_cover_every_row_once(self, order):
+        mongomock = pytest.importorskip("mongomock")
+        users = mongomock.MongoClient().db.users
+        users.insert_many([dict(e) for e in EMPLOYEES])
+        direction = 1 if order == "asc" else -1
+        sort = [("hierarchy_level", direction), ("id", direction)]
+        expected = [u["id"] for u in users.find({}).sort(sort)]
+
+        seen, query = [], {}
+        while True:
+            page = list(users.find(query).sort(sort).limit(2))
+            if not page:
+                break
+            seen += [u["id"] for u in page]
+            last = page[-1]
+            cursor = server.decode_employee_cursor(
+                server.encode_employee_cursor("hierarchy_level", order, last), "hierarchy_level", order
+            )
+            query = server.employee_keyset_filter("hierarchy_level", order, cursor)
+        assert seen == expected
+
+
+class TestCursor:
+    """Opaque cursor round trip"""
+
+    def test_cursor_for_other_sort_is_rejected(self):
+        cursor = server.encode_employee_cursor("last_name", "asc", {"id": "e1", "last_name": "A"})
+        with pytest.raises(HTTPException) as exc:
+            server.decode_employee_cursor(cursor, "email", "asc")
+        assert exc.value.status_code == 400
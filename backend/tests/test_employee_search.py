@@ -0,0 +1,37 @@
+"""
+Unit tests for the employee search keys
+- search_tokens holds only normalized words (what the anchored regex matches)
+- search_rank holds the field-tagged words and the normalized last name used for ranking
+"""
+
+import server
+
+
+EMPLOYEE = {
+    "first_name": "Hélène", "last_name": "Dupré-Martin", "email": "Helene.Dupre@Premidis.com",
+    "position": "Comptable", "department": "Audit"
+}
+
+
+class TestEmployeeSearchKeys:
+    """employee_search_keys"""
+
+    def test_tokens_are_plain_words(self):
+        tokens = server.employee_search_keys(EMPLOYEE)["search_tokens"]
+        assert {"helene", "dupre", "martin", "comptable", "audit", "helene.dupre@premidis.com"} <= set(tokens)
+        assert not any(":" in token for token in tokens)
+
+    def test_field_names_do_not_match_as_prefixes(self):
+        tokens = server.employee_search_keys(EMPLOYEE)["search_tokens"]
+        for prefix in ("la", "de", "em", "ema", "fi", "po"):
+            assert not any(token.startswith(prefix) for token in tokens), prefix
+
+    def test_rank_fields_are_tagged(self):
+        rank = server.employee_search_keys(EMPLOYEE)["search_rank"]
+        assert {"last_name:dupre", "last_name:martin", "first_name:helene", "department:audit"} <= set(rank["fields"])
+        assert rank["last_name"] == "dupre-martin"
+
+    def test_missing_fields(self):
+        keys = server.employee_search_keys({"last_name": "Ngoy"})
+        assert keys["search_tokens"] == ["ngoy"]
+        assert keys["search_rank"] == {"fields": ["last_name:ngoy"], "last_name": "ngoy"}
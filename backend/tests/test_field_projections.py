@@ -0,0 +1,37 @@
+"""
+Unit tests for `fields=` projections
+- summary / full exclude hidden (and heavy) fields
+- Explicit field lists are whitelisted and always include id
+"""
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+FIELDS = server.FieldSet(allowed=["name", "status", "content"], heavy=["content"], hidden=["password"])
+
+
+class TestFieldSetProjection:
+    """FieldSet.projection"""
+
+    @pytest.mark.parametrize("fields", [None, "", "summary"])
+    def test_summary_drops_hidden_and_heavy(self, fields):
+        assert FIELDS.projection(fields) == {"_id": 0, "password": 0, "content": 0}
+
+    def test_full_keeps_heavy(self):
+        assert FIELDS.projection("full") == {"_id": 0, "password": 0}
+
+    def test_explicit_fields_include_id(self):
+        assert FIELDS.projection(" name, status ,") == {"_id": 0, "id": 1, "name": 1, "status": 1}
+
+    def test_unknown_and_hidden_fields_are_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            FIELDS.projection("name,password,salary")
+        assert exc.value.status_code == 400
+        assert "password, salary" in exc.value.detail
+
+    def test_employee_projection_hides_search_tokens(self):
+        projection = server.EMPLOYEE_FIELDS.projection(None)
+        assert projection["password"] == 0 and projection["search_tokens"] == 0
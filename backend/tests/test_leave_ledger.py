@@ -0,0 +1,41 @@
+"""
+Unit tests for leave ledger transitions
+- leave_transition_ledger_entry consumes on approval and reverses when leaving approved
+- Collective leaves never touch individual balances
+"""
+
+import server
+
+
+def make_leave(status, **extra):
+    return {
+        "id": "leave-1", "employee_id": "emp-1", "leave_type": "annual", "status": status,
+        "working_days": 3, "start_date": "2025-06-02", **extra
+    }
+
+
+class TestLeaveTransitionLedgerEntry:
+    """Ledger entries produced by status transitions"""
+
+    def test_approval_consumes_days(self):
+        entry = server.leave_transition_ledger_entry(make_leave("pending"), "approved", "leave:leave-1:1", "admin")
+        assert entry["kind"] == "consume"
+        assert entry["taken"] == 3
+        assert entry["year"] == 2025
+        assert entry["key"] == "leave:leave-1:1"
+
+    def test_leaving_approved_reverses_days(self):
+        entry = server.leave_transition_ledger_entry(make_leave("approved"), "rejected", "leave:leave-1:2", "admin")
+        assert entry["kind"] == "reverse"
+        assert entry["taken"] == -3
+
+    def test_transition_outside_approved_has_no_entry(self):
+        assert server.leave_transition_ledger_entry(make_leave("pending"), "rejected", "k", "admin") is None
+
+    def test_collective_leave_rejection_has_no_entry(self):
+        leave = make_leave("approved", is_collective=True)
+        assert server.leave_transition_ledger_entry(leave, "rejected", "k", "admin") is None
+
+    def test_collective_leave_approval_has_no_entry(self):
+        leave = make_leave("rejected", is_collective=True)
+        assert server.leave_transition_ledger_entry(leave, "approved", "k", "admin") is None
@@ -0,0 +1,45 @@
+"""
+Unit tests for one-off startup migrations
+- run_migration runs a migration once per database and records it in config_state
+"""
+
+import asyncio
+
+import pytest
+
+import server
+
+
+class TestRunMigration:
+    """run_migration"""
+
+    def test_runs_once(self, monkeypatch):
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        db = mongomock_motor.AsyncMongoMockClient().db
+        monkeypatch.setattr(server, "db", db)
+        calls = []
+
+        async def migrate():
+            calls.append(1)
+
+        async def scenario():
+            await server.run_migration("example", migrate)
+            await server.run_migration("example", migrate)
+            await server.run_migration("other", migrate)
+            return await db.config_state.find_one({"id": "migrations"})
+
+        state = asyncio.run(scenario())
+        assert len(calls) == 2
+        assert set(state["done"]) == {"example", "other"}
+
+    def test_failed_migration_is_not_recorded(self, monkeypatch):
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        db = mongomock_motor.AsyncMongoMockClient().db
+        monkeypatch.setattr(server, "db", db)
+
+        async def migrate():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(server.run_migration("broken", migrate))
+        assert asyncio.run(db.config_state.find_one({"id": "migrations"})) is None
@@ -0,0 +1,65 @@
+"""
+Unit tests for the cron schedule used by the job scheduler
+- Parsing of *, lists, ranges and steps, rejection of malformed expressions
+- next_after: strictly later minute, month/day rollover, day-of-month OR day-of-week
+"""
+
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestCronParsing:
+    """Field parsing"""
+
+    def test_lists_ranges_and_steps(self):
+        schedule = server.CronSchedule("0,30 8-10 */10 * 1-5")
+        assert schedule.minutes == {0, 30}
+        assert schedule.hours == {8, 9, 10}
+        assert schedule.days == {1, 11, 21, 31}
+        assert schedule.weekdays == {1, 2, 3, 4, 5}
+
+    def test_sunday_as_seven(self):
+        assert server.CronSchedule("0 0 * * 7").weekdays == {0}
+
+    @pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "0 24 * * *", "0 0 0 * *", "0 0 * 13 *", "a * * * *"])
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(ValueError):
+            server.CronSchedule(expression)
+
+
+class TestCronNextAfter:
+    """Next fire time"""
+
+    def test_strictly_after(self):
+        schedule = server.CronSchedule("*/15 * * * *")
+        assert schedule.next_after(utc(2025, 6, 2, 10, 15)) == utc(2025, 6, 2, 10, 30)
+        assert schedule.next_after(utc(2025, 6, 2, 10, 14, 59, 999)) == utc(2025, 6, 2, 10, 15)
+
+    def test_weekdays_skip_weekend(self):
+        # Friday 2025-06-06 09:00 -> Monday 08:00
+        assert server.CronSchedule("0 8 * * 1-5").next_after(utc(2025, 6, 6, 9, 0)) == utc(2025, 6, 9, 8, 0)
+
+    def test_month_and_year_rollover(self):
+        assert server.CronSchedule("0 0 1 * *").next_after(utc(2025, 12, 15)) == utc(2026, 1, 1)
+        assert server.CronSchedule("0 6 29 2 *").next_after(utc(2025, 3, 1)) == utc(2028, 2, 29, 6, 0)
+
+    def test_day_of_month_or_day_of_week(self):
+        # Both restricted: the 15th or any Monday, whichever comes first
+        schedule = server.CronSchedule("0 0 15 * 1")
+        assert schedule.next_after(utc(2025, 6, 10)) == utc(2025, 6, 15)
+        assert schedule.next_after(utc(2025, 6, 15)) == utc(2025, 6, 16)
+
+    def test_converts_to_utc(self):
+        paris = timezone(timedelta(hours=2))
+        assert server.CronSchedule("0 8 * * *").next_after(datetime(2025, 6, 2, 9, 30, tzinfo=paris)) == utc(2025, 6, 2, 8, 0)
+
+    def test_never_matching_expression(self):
+        with pytest.raises(ValueError):
+            server.CronSchedule("0 0 31 2 *").next_after(utc(2025, 1, 1))
@@ -0,0 +1,57 @@
+"""
+Unit tests for working-day counting
+- count_weekdays matches a day-by-day count
+- calculate_working_days drops weekday holidays only
+- busday_counts agrees with calculate_working_days for a batch
+"""
+
+from datetime import date, timedelta
+
+import server
+
+
+def naive_weekdays(start, end):
+    return sum(1 for i in range((end - start).days + 1) if (start + timedelta(days=i)).weekday() < 5)
+
+
+class TestCountWeekdays:
+    """Arithmetic Monday-Friday count"""
+
+    def test_matches_day_by_day_count(self):
+        start = date(2025, 1, 1)
+        for offset in range(14):
+            for length in range(30):
+                first = start + timedelta(days=offset)
+                last = first + timedelta(days=length)
+                assert server.count_weekdays(first, last) == naive_weekdays(first, last)
+
+    def test_weekend_only(self):
+        assert server.count_weekdays(date(2025, 6, 7), date(2025, 6, 8)) == 0
+
+    def test_reversed_range(self):
+        assert server.count_weekdays(date(2025, 6, 10), date(2025, 6, 2)) == 0
+
+
+class TestCalculateWorkingDays:
+    """Weekdays minus public holidays"""
+
+    def test_weekday_holiday_is_excluded(self):
+        assert server.calculate_working_days("2025-06-02", "2025-06-06", [date(2025, 6, 4)]) == 4
+
+    def test_weekend_and_out_of_range_holidays_are_ignored(self):
+        holidays = [date(2025, 6, 7), date(2025, 7, 1), date(2025, 6, 4), date(2025, 6, 4)]
+        assert server.calculate_working_days("2025-06-02", "2025-06-08", holidays) == 4
+
+
+class TestBusdayCounts:
+    """Vectorized count over many leaves"""
+
+    def test_matches_calculate_working_days(self):
+        holidays = [date(2025, 1, 1), date(2025, 6, 30), date(2025, 12, 25)]
+        starts = ["2025-01-01", "2025-06-27", "2025-12-20", "2025-03-08"]
+        ends = ["2025-01-10", "2025-07-02", "2025-12-31", "2025-03-09"]
+        expected = [server.calculate_working_days(s, e, holidays) for s, e in zip(starts, ends)]
+        assert server.busday_counts(starts, ends, holidays) == expected
+
+    def test_end_date_is_inclusive_and_reversed_is_zero(self):
+        assert server.busday_counts(["2025-06-02", "2025-06-10"], ["2025-06-02", "2025-06-02"], []) == [1, 0]
@@ -81,7 +81,27 @@ const DocumentsModule = () => {
     }
   };
 
-  const handleUseForm = (form) => {
+  // Les listes ne contiennent pas le contenu HTML : on charge l'élément complet à la demande
+  const loadFullForm = async (form) => {
+    if (form.content !== undefined) return form;
+    const response = await axios.get(`/api/documents/forms/${form.id}`);
+    return response.data;
+  };
+
+  const loadFullDocument = async (doc) => {
+    if (doc.content !== undefined) return doc;
+    const response = await axios.get(`/api/documents/${doc.id}`);
+    return response.data;
+  };
+
+  const handleUseForm = async (listForm) => {
+    let form;
+    try {
+      form = await loadFullForm(listForm);
+    } catch (error) {
+      toast.error('Erreur lors du chargement de la forme');
+      return;
+    }
     setSelectedForm(form);
     setEditorContent(form.content);
     setDocumentTitle(`Nouveau ${form.name}`);
@@ -89,7 +109,14 @@ const DocumentsModule = () => {
     setView('editor');
   };
 
-  const handleEditDocument = async (doc) => {
+  const handleEditDocument = async (listDoc) => {
+    let doc;
+    try {
+      doc = await loadFullDocument(listDoc);
+    } catch (error) {
+      toast.error('Erreur lors du chargement du document');
+      return;
+    }
     setCurrentDocument(doc);
     setEditorContent(doc.content);
     setDocumentTitle(doc.title);
@@ -206,7 +233,14 @@ const DocumentsModule = () => {
     }
   };
 
-  const handlePreview = (doc) => {
+  const handlePreview = async (listDoc) => {
+    let doc;
+    try {
+      doc = await loadFullDocument(listDoc);
+    } catch (error) {
+      toast.error('Erreur lors du chargement du document');
+      return;
+    }
     setCurrentDocument(doc);
     setEditorContent(doc.content);
     setDocumentTitle(doc.title);
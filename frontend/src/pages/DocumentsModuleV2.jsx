@@ -94,7 +94,29 @@ const DocumentsModuleV2 = () => {
     }
   };
 
-  const handleUseForm = (form) => {
+  // Les listes ne contiennent pas le contenu HTML : on charge l'élément complet à la demande
+  const loadFullForm = async (form) => {
+    if (form.content !== undefined) return form;
+    const response = await axios.get(`/api/documents/forms/${form.id}`);
+    return response.data;
+  };
+
+  const loadFullDocument = async (doc) => {
+    if (doc.content !== undefined) return doc;
+    // Les documents RH (congés) viennent de /api/hr-documents
+    const url = doc.template_id ? `/api/hr-documents/${doc.id}` : `/api/documents/${doc.id}`;
+    const response = await axios.get(url);
+    return response.data;
+  };
+
+  const handleUseForm = async (listForm) => {
+    let form;
+    try {
+      form = await loadFullForm(listForm);
+    } catch (error) {
+      toast.error('Erreur lors du chargement de la forme');
+      return;
+    }
     console.log('Using form:', form.name, 'Content length:', form.content?.length || 0);
     setSelectedForm(form);
     setEditorContent(form.content);
@@ -104,7 +126,14 @@ const DocumentsModuleV2 = () => {
     setTimeout(() => setView('editor'), 50);
   };
 
-  const handleEditDocument = async (doc) => {
+  const handleEditDocument = async (listDoc) => {
+    let doc;
+    try {
+      doc = await loadFullDocument(listDoc);
+    } catch (error) {
+      toast.error('Erreur lors du chargement du document');
+      return;
+    }
     console.log('Editing document:', doc.title, 'Content length:', doc.content?.length || 0);
     setCurrentDocument(doc);
     setEditorContent(doc.content);
@@ -203,7 +232,14 @@ const DocumentsModuleV2 = () => {
     }
   };
 
-  const handlePreview = (doc) => {
+  const handlePreview = async (listDoc) => {
+    let doc;
+    try {
+      doc = await loadFullDocument(listDoc);
+    } catch (error) {
+      toast.error('Erreur lors du chargement du document');
+      return;
+    }
     setCurrentDocument(doc);
     setEditorContent(doc.content);
     setDocumentTitle(doc.title);
@@ -66,14 +66,33 @@ const DocumentsRHHistory = () => {
     setFilteredDocuments(filtered);
   };
 
-  const handleViewDocument = (doc) => {
-    setSelectedDocument(doc);
-    setViewDialogOpen(true);
+  // La liste ne contient pas le contenu HTML : on charge le document complet à la demande
+  const loadFullDocument = async (doc) => {
+    if (doc.content !== undefined) return doc;
+    const response = await api.get(`/api/hr-documents/${doc.id}`);
+    return response.data;
   };
 
-  const handlePrintDocument = (doc) => {
+  const handleViewDocument = async (doc) => {
+    try {
+      setSelectedDocument(await loadFullDocument(doc));
+      setViewDialogOpen(true);
+    } catch (error) {
+      toast.error('Erreur lors du chargement du document');
+    }
+  };
+
+  const handlePrintDocument = async (listDoc) => {
     // Créer une fenêtre d'impression avec le contenu du document
     const printWindow = window.open('', '_blank');
+    let doc;
+    try {
+      doc = await loadFullDocument(listDoc);
+    } catch (error) {
+      printWindow.close();
+      toast.error('Erreur lors du chargement du document');
+      return;
+    }
     printWindow.document.write(`
       <!DOCTYPE html>
       <html>